@@ -0,0 +1,71 @@
+import os
+from uuid import uuid4
+
+from core.enums import Limits, Tuples
+from core.images import IMAGE_EXTENSIONS
+from core.storage import recipe_image_storage
+from core.uploads import decode_base64_image
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework.fields import ImageField, ReadOnlyField
+
+
+class Base64ImageField(ImageField):
+    """
+    Поле для загрузки изображения строкой base64 (data URL).
+
+    Строка декодируется по частям во временный файл
+    (`core.uploads.decode_base64_image`), а размер файла, формат
+    и разрешение проверяются до полного декодирования изображения.
+    Ограничения задаются `Limits.MAX_IMAGE_SIZE`
+    и `Limits.MAX_IMAGE_PIXELS`.
+    """
+
+    def to_internal_value(self, data: str) -> UploadedFile:
+        if not data or not isinstance(data, str):
+            self.fail("invalid")
+
+        file, image_format, _ = decode_base64_image(
+            data,
+            max_size=Limits.MAX_IMAGE_SIZE,
+            max_pixels=Limits.MAX_IMAGE_PIXELS,
+            allowed_formats=Tuples.RECIPE_IMAGE_UPLOAD_FORMATS.value,
+        )
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        extension = IMAGE_EXTENSIONS.get(image_format, image_format)
+
+        return UploadedFile(
+            file=file,
+            name=f"{uuid4()}.{extension}",
+            content_type=f"image/{image_format}",
+            size=size,
+        )
+
+
+class ImageSrcsetField(ReadOnlyField):
+    """
+    Поле с вариантами изображения рецепта в формате `srcset`.
+
+    Возвращает словарь, где ключи - форматы (avif, webp, jpeg),
+    значения - строки вида "url 160w, url 320w, url 500w".
+    Пока варианты не созданы, словарь пустой и клиент использует `image`.
+    """
+
+    def __init__(self, **kwargs) -> None:
+        kwargs.setdefault("source", "renditions")
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions: dict) -> dict[str, str]:
+        request = self.context.get("request")
+        srcset = {}
+
+        for image_format, files in renditions.items():
+            urls = []
+            for name, width in files:
+                url = recipe_image_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f"{url} {width}w")
+            srcset[image_format] = ", ".join(urls)
+
+        return srcset
@@ -1,5 +1,7 @@
-from django.db.models import Model, Q
-from django.db.utils import IntegrityError
+from core.services import create_relation, delete_relation
+from django.core.exceptions import ValidationError
+from django.db.models import Model
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.serializers import ModelSerializer
@@ -13,10 +15,39 @@ from rest_framework.status import (
 class AddDelViewMixin:
     """
     Миксин для добавления и удаления связей между объектами.
+
+    Связь - запись `link_model`, где поле `link_field` ссылается
+    на объект, а поле `user` - на текущего пользователя. Добавление
+    и удаление выполняются одним запросом к базе данных
+    (`core.services.create_relation` и `delete_relation`), поэтому
+    повторные и одновременные запросы обрабатываются без исключений.
+    Объект для ответа загружается только после создания связи.
     """
 
     add_serializer: ModelSerializer | None = None
     link_model: Model | None = None
+    link_field: str | None = None
+
+    def _link_values(self, obj_id: int | str, context) -> dict:
+        """
+        Возвращает значения полей связи с объектом obj_id.
+
+        Args:
+            obj_id (int | str): Идентификатор объекта.
+            context: Контекст запроса.
+
+        Returns:
+            dict: Значения полей `<link_field>_id` и `user_id`.
+        """
+        field = self.link_model._meta.get_field(self.link_field)
+        try:
+            obj_id = field.target_field.to_python(obj_id)
+        except ValidationError:
+            raise Http404
+        return {
+            field.attname: obj_id,
+            "user_id": context['request'].user.pk,
+        }
 
     def _create_relation(self, obj_id: int | str, context=None) -> Response:
         """
@@ -29,35 +60,32 @@ class AddDelViewMixin:
         Returns:
             Response: Ответ API с данными о созданной связи.
         """
-        obj = get_object_or_404(self.queryset, pk=obj_id)
-        try:
-            self.link_model(None, obj.pk, context['request'].user.pk).save()
-        except IntegrityError:
+        values = self._link_values(obj_id, context)
+        if create_relation(self.link_model, **values) is None:
+            if not self.queryset.filter(pk=obj_id).exists():
+                raise Http404
             return Response(
                 {"error": "Действие уже выполнено ранее."},
                 status=HTTP_400_BAD_REQUEST,
             )
 
+        obj = get_object_or_404(self.queryset, pk=obj_id)
         serializer: ModelSerializer = self.add_serializer(obj, context=context)
         return Response(serializer.data, status=HTTP_201_CREATED)
 
-    def _delete_relation(self, q: Q, context=None) -> Response:
+    def _delete_relation(self, obj_id: int | str, context=None) -> Response:
         """
         Удаляет связь между объектами.
 
         Args:
-            q (Q): Условие для поиска связи.
+            obj_id (int | str): Идентификатор объекта.
             context: Контекст запроса.
 
         Returns:
             Response: Ответ API об успешном удалении связи.
         """
-        deleted, _ = (
-            self.link_model.objects.filter(q & Q(user=context['request'].user))
-            .first()
-            .delete()
-        )
-        if not deleted:
+        values = self._link_values(obj_id, context)
+        if delete_relation(self.link_model, **values) is None:
             return Response(
                 {"error": f"{self.link_model.__name__} не существует"},
                 status=HTTP_400_BAD_REQUEST,
@@ -1,4 +1,24 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date
+from functools import partial, reduce
+from operator import or_
+from typing import Callable
+from urllib.parse import urlencode
+
+from core.cache import cached_count
+from core.enums import UrlQueries
+from core.services import estimated_count
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class PageLimitPagination(PageNumberPagination):
@@ -9,3 +29,254 @@ class PageLimitPagination(PageNumberPagination):
 
     page_size = 6
     page_size_query_param = "limit"
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """
+    Пагинатор Django, получающий количество объектов от функции count
+    (например, из кэша) вместо `COUNT(*)` по списку объектов.
+    """
+
+    def __init__(
+        self, *args, count: Callable[[], int] | None = None, **kwargs
+    ) -> None:
+        self._count = count
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self) -> int:
+        if self._count is None:
+            return super().count
+        return self._count()
+
+
+class PageLimitKeysetPagination(PageLimitPagination):
+    """
+    Пагинация по номеру страницы или по ключу (keyset).
+
+    По умолчанию работает как `PageLimitPagination`. Если в запросе
+    есть параметр `cursor` (для первой страницы - пустой), страница
+    выбирается условием на поля сортировки после последнего элемента
+    предыдущей страницы, без `COUNT(*)` и `OFFSET`. В этом режиме
+    `count` в ответе равен `null`, а `next` и `previous` содержат
+    ссылки с курсором.
+
+    Поля сортировки задаются атрибутом представления `keyset_ordering`,
+    последним полем должно быть уникальное (обычно `id`).
+
+    В режиме номеров страниц для действий из `cached_count_actions`
+    представления количество объектов кэшируется по пути запроса
+    и параметрам фильтрации (`core.cache.cached_count`). Для действий
+    из `user_count_actions` и фильтров по избранному и корзине
+    количество кэшируется отдельно для каждого пользователя.
+    Для списка без фильтров параметр `count=estimate` включает оценку
+    количества по статистике PostgreSQL.
+    """
+
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    estimate_count_value = "estimate"
+    invalid_cursor_message = "Некорректный курсор."
+    ordering = ("-pub_date", "-id")
+    user_filter_params = (
+        UrlQueries.FAVORITE.value,
+        UrlQueries.SHOP_CART.value,
+    )
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> list | None:
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            self.django_paginator_class = partial(
+                CachedCountPaginator,
+                count=self.get_count_function(queryset, request, view),
+            )
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.ordering = getattr(view, "keyset_ordering", self.ordering)
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._invert(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else position is not None
+        has_previous = position is not None if not reverse else has_more
+        self.next_position = (
+            self._position(results[-1]) if has_next and results else None
+        )
+        self.previous_position = (
+            self._position(results[0]) if has_previous and results else None
+        )
+        return results
+
+    def get_count_function(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> Callable[[], int] | None:
+        """
+        Возвращает функцию, вычисляющую количество объектов с учетом кэша
+        или оценки, либо None, если количество считается как обычно.
+
+        Args:
+            queryset: Список объектов для пагинации.
+            request: Запрос.
+            view: Представление.
+
+        Returns:
+            Функция без аргументов или None.
+        """
+        action = getattr(view, "action", None)
+        if action not in getattr(view, "cached_count_actions", ()):
+            return None
+
+        skip = {
+            self.page_query_param,
+            self.page_size_query_param,
+            self.cursor_query_param,
+            self.count_query_param,
+        }
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in skip
+        )
+        per_user = action in getattr(view, "user_count_actions", ()) or any(
+            key in self.user_filter_params for key, _ in params
+        )
+        user_id = request.user.pk if per_user else None
+
+        estimate = request.query_params.get(self.count_query_param)
+        if estimate == self.estimate_count_value and not (params or per_user):
+            count = estimated_count(queryset.model)
+            if count is not None:
+                return lambda: count
+
+        return partial(
+            cached_count,
+            f"{request.path}?{urlencode(params, doseq=True)}",
+            user_id,
+            queryset.count,
+        )
+
+    def get_paginated_response(self, data: list) -> Response:
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        return Response(
+            OrderedDict(
+                (
+                    ("count", None),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                )
+            )
+        )
+
+    def get_next_link(self) -> str | None:
+        if not self.keyset:
+            return super().get_next_link()
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self) -> str | None:
+        if not self.keyset:
+            return super().get_previous_link()
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def decode_cursor(self, request: Request) -> tuple[list | None, bool]:
+        """
+        Разбирает курсор из параметров запроса.
+
+        Args:
+            request: Запрос.
+
+        Returns:
+            Значения полей сортировки последнего элемента (None для
+            первой страницы) и признак движения назад.
+        """
+        encoded = request.query_params[self.cursor_query_param]
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            position, reverse = cursor["p"], bool(cursor.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or (
+            len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(
+        self, position: list | None, reverse: bool
+    ) -> str | None:
+        """
+        Возвращает ссылку на страницу после (или перед) position.
+        """
+        if position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        cursor = json.dumps({"p": position, "r": int(reverse)})
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def _position(self, obj) -> list:
+        """
+        Значения полей сортировки объекта для курсора.
+        """
+        position = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip("-"))
+            if isinstance(value, date):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    @staticmethod
+    def _invert(field: str) -> str:
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _after(ordering: tuple[str, ...], position: list) -> Q:
+        """
+        Условие "строго после position" для лексикографической
+        сортировки по полям ordering:
+        `(a > x) OR (a = x AND b > y) OR ...`.
+        """
+        conditions = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                prev.lstrip("-"): value
+                for prev, value in zip(ordering[:i], position)
+            }
+            equal[f"{name}__{lookup}"] = position[i]
+            conditions.append(Q(**equal))
+        return reduce(or_, conditions)
@@ -0,0 +1,34 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NdjsonParser(BaseParser):
+    """
+    Парсер NDJSON: по одному JSON-объекту в строке.
+
+    Тело запроса читается построчно, пустые строки пропускаются.
+    Результат - список объектов, как у JSON-массива.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None) -> list:
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        items = []
+
+        reader = codecs.getreader(encoding)(stream)
+        for number, line in enumerate(reader, start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as error:
+                raise ParseError(
+                    f"NDJSON parse error (line {number}): {error}"
+                )
+        return items
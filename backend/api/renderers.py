@@ -0,0 +1,158 @@
+import csv
+import json
+from datetime import datetime as dt
+from io import BytesIO
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from foodgram.settings import DATE_TIME_FORMAT
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    Список покупок отдается потоково через `stream`, `render` используется
+    только для ответов без списка (ошибки, пустая корзина).
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, dict) and "detail" in data:
+            data = data["detail"]
+        return str(data).encode(self.charset)
+
+    def stream(self, ingredients: Iterable[dict], user) -> Iterator[str]:
+        """
+        Возвращает генератор частей файла со списком покупок.
+
+        :param ingredients: Ингредиенты с полями
+            `name`, `measurement`, `amount`.
+        :param user: Пользователь, для которого создается список покупок.
+        :return: Генератор частей файла.
+        """
+        raise NotImplementedError(".stream() must be implemented.")
+
+
+class ShoppingListTxtRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+    def stream(self, ingredients: Iterable[dict], user) -> Iterator[str]:
+        yield (
+            f"Список покупок для:\n\n{user.first_name}\n"
+            f"{dt.now().strftime(DATE_TIME_FORMAT)}\n\n"
+        )
+        for ing in ingredients:
+            yield f'{ing["name"]}: {ing["amount"]} {ing["measurement"]}\n'
+        yield "\nПосчитано в Foodgram"
+
+
+class _Echo:
+    """
+    Файлоподобный объект, возвращающий записанную строку
+    (для потоковой записи через `csv.writer`).
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class ShoppingListCsvRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, ingredients: Iterable[dict], user) -> Iterator[str]:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(("name", "amount", "measurement_unit"))
+        for ing in ingredients:
+            yield writer.writerow(
+                (ing["name"], ing["amount"], ing["measurement"])
+            )
+
+
+class ShoppingListJsonRenderer(ShoppingListRenderer):
+    media_type = "application/json"
+    format = "json"
+
+    def stream(self, ingredients: Iterable[dict], user) -> Iterator[str]:
+        yield "["
+        separator = ""
+        for ing in ingredients:
+            item = {
+                "name": ing["name"],
+                "amount": ing["amount"],
+                "measurement_unit": ing["measurement"],
+            }
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ","
+        yield "]"
+
+
+class ShoppingListPdfRenderer(ShoppingListRenderer):
+    """
+    PDF-файл строится постранично в памяти и отдается одним куском.
+    Шрифт с кириллицей задается настройкой `SHOPPING_LIST_PDF_FONT`.
+    """
+
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    font_name = "ShoppingListFont"
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def register_font(self) -> None:
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+            )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return json.dumps(data, ensure_ascii=False).encode()
+
+    def stream(self, ingredients: Iterable[dict], user) -> Iterator[bytes]:
+        self.register_font()
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        _, height = A4
+        y = height - self.margin
+
+        lines = (
+            f'{ing["name"]}: {ing["amount"]} {ing["measurement"]}'
+            for ing in ingredients
+        )
+        header = (
+            f"Список покупок для: {user.first_name}",
+            dt.now().strftime(DATE_TIME_FORMAT),
+            "",
+        )
+        for line in (*header, *lines, "", "Посчитано в Foodgram"):
+            if y < self.margin:
+                canvas.showPage()
+                y = height - self.margin
+            canvas.setFont(self.font_name, self.font_size)
+            canvas.drawString(self.margin, y, line)
+            y -= self.line_height
+
+        canvas.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTxtRenderer,
+    ShoppingListCsvRenderer,
+    ShoppingListJsonRenderer,
+    ShoppingListPdfRenderer,
+)
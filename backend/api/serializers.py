@@ -1,17 +1,26 @@
 from collections import OrderedDict
 
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
-from django.db.models import F, QuerySet
 from django.db.transaction import atomic
 
-from drf_extra_fields.fields import Base64ImageField
-
-from core.services import recipe_ingredients_set
-from core.validators import ingredients_validator, tags_exist_validator
+from api.fields import Base64ImageField, ImageSrcsetField
+from core.cache import get_tag_snapshot
+from core.enums import Limits
+from core.services import (
+    cart_totals_recipe_changed,
+    recipe_ingredients_set,
+    recipe_ingredients_update,
+)
+from core.validators import recipe_relations_validator
 
 from recipes.models import Ingredient, Recipe, Tag
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.serializers import (
+    IntegerField,
+    ListField,
+    ModelSerializer,
+    Serializer,
+    SerializerMethodField,
+)
 
 
 User = get_user_model()
@@ -22,13 +31,26 @@ class ShortRecipeSerializer(ModelSerializer):
     Сериализатор для краткой информации о рецептах.
     """
     image = Base64ImageField()
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
-        fields = "id", "name", "image", "cooking_time"
+        fields = "id", "name", "image", "image_srcset", "cooking_time"
         read_only_fields = ("__all__",)
 
 
+class RecipeIdsSerializer(Serializer):
+    """
+    Сериализатор списка ID рецептов для пакетных операций
+    с избранным и корзиной.
+    """
+
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        max_length=Limits.MAX_BULK_RECIPES.value,
+    )
+
+
 class UserSerializer(ModelSerializer):
     """
     Сериализатор для пользователей.
@@ -50,17 +72,32 @@ class UserSerializer(ModelSerializer):
         extra_kwargs = {"password": {"write_only": True}}
         read_only_fields = ("is_subscribed",)
 
+    def get_subscribed_ids(self) -> set[int]:
+        """
+        Возвращает множество id авторов, на которых подписан
+        текущий пользователь.
+
+        Множество загружается одним запросом и кэшируется в контексте
+        сериализатора, поэтому общий контекст вложенных и списочных
+        сериализаторов делает этот запрос один раз за запрос к API.
+        """
+        subscribed_ids = self.context.get("subscribed_ids")
+        if subscribed_ids is None:
+            user = self.context.get("request").user
+            subscribed_ids = set()
+            if not user.is_anonymous:
+                subscribed_ids.update(
+                    user.subscriptions.values_list("author_id", flat=True)
+                )
+            self.context["subscribed_ids"] = subscribed_ids
+        return subscribed_ids
+
     def get_is_subscribed(self, obj: User) -> bool:
         """
         Возвращает True, если текущий пользователь подписан
         на пользователя obj, иначе - False.
         """
-        user = self.context.get("request").user
-
-        if user.is_anonymous or (user == obj):
-            return False
-
-        return user.subscriptions.filter(author=obj).exists()
+        return obj.pk in self.get_subscribed_ids()
 
     def create(self, validated_data: dict) -> User:
         """
@@ -99,36 +136,33 @@ class UserSubscribeSerializer(UserSerializer):
         )
         read_only_fields = ("__all__",)
 
-    def get_is_subscribed(self, obj: User) -> bool:
-        """
-        Проверяет, подписан ли текущий пользователь на пользователя obj.
-        :param obj: Пользователь, на которого проверяется подписка.
-        :return: True, если текущий пользователь подписан на пользователя obj,
-        иначе False.
-        """
-        user = self.context.get("request").user
-
-        if user.is_anonymous or user == obj:
-            return False
-
-        return user.subscriptions.filter(author=obj).exists()
-
     def get_recipes_count(self, obj: User) -> int:
         """
         Возвращает количество рецептов пользователя.
+        Использует аннотацию `recipes_count`, если она есть.
         """
+        if hasattr(obj, "recipes_count"):
+            return obj.recipes_count
+
         return obj.recipes.count()
 
     def get_recipes(self, obj):
         """
         Возвращает список рецептов пользователя с ограничением по лимиту.
+        Рецепты берутся из `author_recipes` в контексте, если вьюсет
+        загрузил их заранее для всей страницы.
         """
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
+        author_recipes = self.context.get("author_recipes")
+
+        if author_recipes is not None:
+            recipes = author_recipes.get(obj.pk, [])
+        else:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = obj.recipes.all()
 
-        if limit:
-            recipes = recipes[:int(limit)]
+            if limit:
+                recipes = recipes[:int(limit)]
         serializer = ShortRecipeSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
@@ -175,6 +209,7 @@ class RecipeSerializer(ModelSerializer):
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
@@ -187,6 +222,7 @@ class RecipeSerializer(ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_srcset",
             "text",
             "cooking_time",
         )
@@ -195,21 +231,40 @@ class RecipeSerializer(ModelSerializer):
             "is_shopping_cart",
         )
 
-    def get_ingredients(self, recipe: Recipe) -> QuerySet[dict]:
+    def get_ingredients(self, recipe: Recipe) -> list[dict]:
         """
         Возвращает информацию об ингредиентах для данного рецепта.
+        Строки `AmountIngredient` берутся из `prefetch_related`,
+        если вьюсет их подгрузил, иначе - одним запросом
+        вместе с ингредиентами.
         """
-        ingredients = recipe.ingredients.values(
-            "id", "name", "measurement_unit", amount=F("recipe__amount")
-        )
-        return ingredients
+        links = recipe.ingredient.all()
+        if "ingredient" not in getattr(
+            recipe, "_prefetched_objects_cache", {}
+        ):
+            links = links.select_related("ingredients").order_by(
+                "ingredients__name"
+            )
+        return [
+            {
+                "id": link.ingredients.id,
+                "name": link.ingredients.name,
+                "measurement_unit": link.ingredients.measurement_unit,
+                "amount": link.amount,
+            }
+            for link in links
+        ]
 
     def get_is_favorited(self, recipe: Recipe) -> bool:
         """
         Возвращает True, если текущий пользователь
         добавил рецепт в избранное, иначе - False.
+        Использует аннотацию из `RecipeViewSet.get_queryset`, если она есть.
         """
-        user = self.context.get("view").request.user
+        if hasattr(recipe, "is_favorited"):
+            return recipe.is_favorited
+
+        user = self.context.get("request").user
 
         if user.is_anonymous:
             return False
@@ -220,8 +275,12 @@ class RecipeSerializer(ModelSerializer):
         """
         Возвращает True, если текущий пользователь
         добавил рецепт в список покупок, иначе - False.
+        Использует аннотацию из `RecipeViewSet.get_queryset`, если она есть.
         """
-        user = self.context.get("view").request.user
+        if hasattr(recipe, "is_in_shopping_cart"):
+            return recipe.is_in_shopping_cart
+
+        user = self.context.get("request").user
 
         if user.is_anonymous:
             return False
@@ -232,14 +291,13 @@ class RecipeSerializer(ModelSerializer):
         """
         Проверяет валидность данных при создании или обновлении рецепта.
         """
-        tags_ids: list[int] = self.initial_data.get("tags")
-        ingredients = self.initial_data.get("ingredients")
-
-        if not tags_ids or not ingredients:
-            raise ValidationError("Недостаточно данных.")
-
-        tags = tags_exist_validator(tags_ids, Tag)
-        ingredients = ingredients_validator(ingredients, Ingredient)
+        tags, ingredients = recipe_relations_validator(
+            self.initial_data.get("tags"),
+            self.initial_data.get("ingredients"),
+            get_tag_snapshot().by_id,
+            Ingredient,
+            self.context.get("known_ingredients"),
+        )
 
         data.update(
             {
@@ -255,29 +313,34 @@ class RecipeSerializer(ModelSerializer):
         """
         Создает и возвращает новый рецепт.
         """
-        tags: list[int] = validated_data.pop("tags")
-        ingredients: dict[int, tuple] = validated_data.pop("ingredients")
+        tags: list[Tag] = validated_data.pop("tags")
+        ingredients: dict[int, int] = validated_data.pop("ingredients")
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         recipe_ingredients_set(recipe, ingredients)
         return recipe
 
     @atomic
-    def update(self, recipe: Recipe, validated_data: dict):
+    def update(self, recipe: Recipe, validated_data: dict) -> Recipe:
         """
         Обновляет информацию о рецепте.
+
+        Рецепт сохраняется одним запросом. Тэги и ингредиенты
+        сравниваются с текущими, в базе данных меняются только
+        отличающиеся строки.
         """
-        super().update(recipe, validated_data)
+        tags: list[Tag] = validated_data.pop("tags")
+        ingredients: dict[int, int] = validated_data.pop("ingredients")
 
-        tags = validated_data.pop("tags")
-        ingredients = validated_data.pop("ingredients")
+        for attr, value in validated_data.items():
+            setattr(recipe, attr, value)
+        recipe.save()
 
         if tags:
             recipe.tags.set(tags)
 
         if ingredients:
-            recipe.ingredients.clear()
-            recipe_ingredients_set(recipe, ingredients)
+            old_amounts = recipe_ingredients_update(recipe, ingredients)
+            cart_totals_recipe_changed(recipe.pk, old_amounts, ingredients)
 
-        recipe.save()
         return recipe
@@ -1,31 +1,67 @@
 from django.contrib.auth import get_user_model
 from django.core.handlers.wsgi import WSGIRequest
-from django.db.models import Q
-from django.http.response import HttpResponse
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    OuterRef,
+    Prefetch,
+    QuerySet,
+    Value,
+)
+from django.http import Http404
+from django.http.response import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from djoser.views import UserViewSet as DjoserUserViewSet
-from django_filters import rest_framework as filters
 from rest_framework.decorators import action
-from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (
+    DjangoModelPermissions,
+    IsAdminUser,
+    IsAuthenticated,
+)
 from rest_framework.response import Response
 from rest_framework.routers import APIRootView
 from rest_framework.status import (
+    HTTP_201_CREATED,
     HTTP_400_BAD_REQUEST,
     HTTP_405_METHOD_NOT_ALLOWED
 )
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
 from api.mixins import AddDelViewMixin
-from api.paginators import PageLimitPagination
+from api.paginators import PageLimitKeysetPagination
+from api.parsers import NdjsonParser
 from api.permissions import AdminOrReadOnly, AuthorStaffOrReadOnly
+from api.renderers import SHOPPING_LIST_RENDERERS
 from api.serializers import (
     IngredientSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     ShortRecipeSerializer,
     TagSerializer,
     UserSubscribeSerializer,
 )
-from core.services import create_shoping_list
-from recipes.models import Carts, Favorites, Ingredient, Recipe, Tag
+from core.cache import get_tag_snapshot
+from core.enums import Limits, UrlQueries
+from core.services import (
+    bulk_create_recipes,
+    find_ingredients,
+    recipes_by_authors,
+    shopping_cart_ingredients,
+    shopping_cart_state,
+    update_user_recipes,
+)
+from core.validators import collect_ingredients_ids
+from recipes.models import (
+    AmountIngredient,
+    Carts,
+    Favorites,
+    Ingredient,
+    Recipe,
+    Tag,
+)
 from users.models import Subscriptions
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes.filters import RecipeFilter
@@ -45,10 +81,14 @@ class UserViewSet(DjoserUserViewSet, AddDelViewMixin):
     Вьюсет для пользователей.
     """
 
-    pagination_class = PageLimitPagination
+    pagination_class = PageLimitKeysetPagination
+    keyset_ordering = ("username", "id")
+    cached_count_actions = ("subscriptions",)
+    user_count_actions = ("subscriptions",)
     permission_classes = (DjangoModelPermissions,)
     add_serializer = UserSubscribeSerializer
     link_model = Subscriptions
+    link_field = "author"
 
     @action(
         methods=('post', 'delete'),
@@ -61,11 +101,14 @@ class UserViewSet(DjoserUserViewSet, AddDelViewMixin):
         DELETE: удаление подписки на пользователя.
         """
         if request.method == 'POST':
+            if str(id) == str(request.user.pk):
+                return Response(
+                    {"error": "Нельзя подписаться на самого себя."},
+                    status=HTTP_400_BAD_REQUEST,
+                )
             return self._create_relation(id, context={'request': request})
         elif request.method == 'DELETE':
-            return self._delete_relation(
-                Q(author__id=id), context={'request': request}
-            )
+            return self._delete_relation(id, context={'request': request})
         else:
             return Response(status=HTTP_405_METHOD_NOT_ALLOWED)
 
@@ -75,12 +118,24 @@ class UserViewSet(DjoserUserViewSet, AddDelViewMixin):
     def subscriptions(self, request: WSGIRequest) -> Response:
         """
         Получение списка подписок пользователя.
+
+        Количество рецептов аннотируется через `Count`, а рецепты всех
+        авторов страницы загружаются одним запросом.
         """
         pages = self.paginate_queryset(
             User.objects.filter(subscribers__user=self.request.user)
+            .annotate(recipes_count=Count("recipes"))
+            .order_by("username")
+        )
+        limit = request.query_params.get("recipes_limit")
+        author_recipes = recipes_by_authors(
+            [author.pk for author in pages],
+            int(limit) if limit else None,
         )
         serializer = UserSubscribeSerializer(
-            pages, many=True, context={'request': request}
+            pages,
+            many=True,
+            context={'request': request, 'author_recipes': author_recipes},
         )
         return self.get_paginated_response(serializer.data)
 
@@ -94,21 +149,44 @@ class TagViewSet(ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (AdminOrReadOnly,)
 
+    def get_queryset(self) -> tuple[Tag, ...]:
+        """
+        Возвращает теги из снимка каталога тегов (`get_tag_snapshot`)
+        без запроса к базе данных.
+        """
+        return get_tag_snapshot().tags
 
-class IngredientFilter(filters.FilterSet):
-    search_name = filters.CharFilter(
-        field_name="name", lookup_expr="icontains")
-
-    class Meta:
-        model = Ingredient
-        fields = ["search_name"]
+    def get_object(self) -> Tag:
+        """
+        Возвращает тег из снимка каталога тегов по ID из URL.
+        """
+        lookup = str(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        tag = None
+        if lookup.isdigit():
+            tag = get_tag_snapshot().by_id.get(int(lookup))
+        if tag is None:
+            raise Http404
+        self.check_object_permissions(self.request, tag)
+        return tag
 
 
 class IngredientViewSet(ReadOnlyModelViewSet):
+    """
+    Вьюсет для ингредиентов.
+
+    Поиск по `?name=` выполняется по индексу в памяти процесса:
+    сначала совпадения по началу названия, затем - по подстроке.
+    Если ничего не найдено, запрос повторяется с исправленной раскладкой.
+    Результаты кэшируются с учетом версии каталога.
+    """
+
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AdminOrReadOnly,)
-    filterset_class = IngredientFilter
+
+    def list(self, request: WSGIRequest, *args, **kwargs) -> Response:
+        query = request.query_params.get(UrlQueries.SEARCH_ING_NAME.value, "")
+        return Response(find_ingredients(query))
 
 
 class RecipeViewSet(ModelViewSet, AddDelViewMixin):
@@ -120,8 +198,48 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
     queryset = Recipe.objects.select_related("author")
     serializer_class = RecipeSerializer
     permission_classes = (AuthorStaffOrReadOnly,)
-    pagination_class = PageLimitPagination
+    pagination_class = PageLimitKeysetPagination
+    cached_count_actions = ("list",)
     add_serializer = ShortRecipeSerializer
+    link_field = "recipe"
+    batch_modes = {"POST": "add", "DELETE": "remove", "PUT": "replace"}
+
+    def get_queryset(self) -> QuerySet[Recipe]:
+        """
+        Аннотирует рецепты флагами `is_favorited` и `is_in_shopping_cart`
+        для текущего пользователя, чтобы сериализатор не обращался к базе
+        данных для каждого рецепта. При выводе списка и одного рецепта
+        тэги и ингредиенты подгружаются через `prefetch_related` одним
+        запросом на страницу.
+        """
+        queryset = super().get_queryset()
+        user = self.request.user
+
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.prefetch_related(
+                "tags",
+                Prefetch(
+                    "ingredient",
+                    queryset=AmountIngredient.objects.select_related(
+                        "ingredients"
+                    ).order_by("ingredients__name"),
+                ),
+            )
+
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorites.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                Carts.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+        )
 
     @action(
         methods=('post', 'delete'),
@@ -136,9 +254,7 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
         if request.method == 'POST':
             return self._create_relation(pk, context={'request': request})
         elif request.method == 'DELETE':
-            return self._delete_relation(
-                Q(recipe__id=pk), context={'request': request}
-            )
+            return self._delete_relation(pk, context={'request': request})
         else:
             return Response(status=HTTP_405_METHOD_NOT_ALLOWED)
 
@@ -168,33 +284,217 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
         self, request: WSGIRequest, pk: int | str
     ) -> Response:
         self.link_model = Carts
-        return self._delete_relation(
-            Q(recipe__id=pk), context={'request': request}
+        return self._delete_relation(pk, context={'request': request})
+
+    @action(
+        methods=("post", "put", "delete"),
+        detail=False,
+        url_path="favorite/batch",
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_batch(self, request: WSGIRequest) -> Response:
+        """
+        Пакетное изменение избранного (см. `_update_user_recipes`).
+        """
+        return self._update_user_recipes(request, Favorites)
+
+    @action(
+        methods=("post", "put", "delete"),
+        detail=False,
+        url_path="shopping_cart/batch",
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request: WSGIRequest) -> Response:
+        """
+        Пакетное изменение корзины покупок (см. `_update_user_recipes`).
+        """
+        return self._update_user_recipes(request, Carts)
+
+    def _update_user_recipes(
+        self, request: WSGIRequest, model: type[Favorites | Carts]
+    ) -> Response:
+        """
+        Добавляет (POST), удаляет (DELETE) или заменяет (PUT) рецепты
+        в избранном или корзине списком `{"recipes": [1, 2, 3]}`
+        за один запрос к API (`core.services.update_user_recipes`).
+
+        Args:
+            request (WSGIRequest): Запрос от клиента.
+            model (type[Favorites | Carts]): Модель связи.
+
+        Returns:
+            Response: ID рецептов после изменения (`recipes`),
+            добавленных (`added`) и удаленных (`removed`).
+
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        mode = self.batch_modes[request.method]
+        added, removed = update_user_recipes(
+            model,
+            request.user.pk,
+            serializer.validated_data["recipes"],
+            mode,
+        )
+        recipes = list(
+            model.objects.filter(user=request.user)
+            .order_by("recipe_id")
+            .values_list("recipe_id", flat=True)
+        )
+        return Response(
+            {"recipes": recipes, "added": added, "removed": removed}
         )
 
-    @action(methods=("get",), detail=False)
+    @action(
+        methods=("post",),
+        detail=False,
+        permission_classes=(IsAdminUser,),
+        parser_classes=(JSONParser, NdjsonParser),
+    )
+    def bulk(self, request: WSGIRequest) -> Response:
+        """
+        Пакетное создание рецептов (только для сотрудников).
+
+        Принимает JSON-массив или NDJSON (`application/x-ndjson`)
+        с рецептами в формате `POST /api/recipes/`. Все рецепты
+        проверяются по одному снимку тэгов и одному заранее
+        загруженному набору ингредиентов. Корректные рецепты создаются
+        пакетами (`core.services.bulk_create_recipes`), для остальных
+        возвращаются ошибки.
+
+        Args:
+            request (WSGIRequest): Запрос от клиента.
+
+        Returns:
+            Response: Количество созданных рецептов и результаты
+            в порядке запроса: `{"index": 0, "id": 12}`
+            или `{"index": 1, "errors": {...}}`.
+
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "Ожидается список рецептов."},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > Limits.MAX_BULK_RECIPES:
+            return Response(
+                {
+                    "error": f"Не больше {Limits.MAX_BULK_RECIPES.value} "
+                    "рецептов за запрос."
+                },
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        results, valid = self._validate_bulk(items)
+        recipes = bulk_create_recipes([data for _, data in valid])
+        for (index, _), recipe in zip(valid, recipes):
+            results[index] = {"index": index, "id": recipe.pk}
+
+        return Response(
+            {"created": len(recipes), "results": results},
+            status=HTTP_201_CREATED if recipes else HTTP_400_BAD_REQUEST,
+        )
+
+    def _validate_bulk(
+        self, items: list
+    ) -> tuple[list[dict | None], list[tuple[int, dict]]]:
+        """
+        Проверяет рецепты пакета.
+
+        Существование ингредиентов всех рецептов проверяется одним
+        запросом, уникальность названий у автора - еще одним.
+
+        Args:
+            items (list): Необработанные данные рецептов.
+
+        Returns:
+            tuple: Результаты (ошибки или None для корректных рецептов)
+            и список пар (индекс, проверенные данные).
+        """
+        context = self.get_serializer_context()
+        context["known_ingredients"] = set(
+            Ingredient.objects.filter(
+                pk__in=collect_ingredients_ids(items)
+            ).values_list("pk", flat=True)
+        )
+        results, valid = [], []
+
+        for index, item in enumerate(items):
+            serializer = RecipeSerializer(data=item, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+                results.append(None)
+            else:
+                results.append({"index": index, "errors": serializer.errors})
+
+        taken = set(
+            Recipe.objects.filter(
+                author=self.request.user,
+                name__in=[data["name"] for _, data in valid],
+            ).values_list("name", flat=True)
+        )
+        unique = []
+        for index, data in valid:
+            if data["name"] in taken:
+                results[index] = {
+                    "index": index,
+                    "errors": {
+                        "name": ["У вас уже есть рецепт с таким названием."]
+                    },
+                }
+                continue
+            taken.add(data["name"])
+            unique.append((index, data))
+
+        return results, unique
+
+    @action(
+        methods=("get",),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+    )
     def download_shopping_cart(self, request: WSGIRequest) -> Response:
         """
-        Метод для конкретной реализации добавления рецепта в корзину.
+        Выгрузка списка покупок пользователя.
+
+        Формат выбирается параметром `?format=txt|csv|json|pdf`
+        (по умолчанию - txt). Список отдается потоково, заголовки
+        `ETag` и `Last-Modified` позволяют повторной загрузке неизменной
+        корзины получить ответ 304 без пересчета списка.
 
         Args:
             request (WSGIRequest): Запрос от клиента.
-            pk (int | str): Идентификатор рецепта,
-            который нужно добавить в корзину.
 
         Returns:
-            Response: Ответ сервера, обычно с
-            информацией об успешном добавлении.
+            StreamingHttpResponse: Файл со списком покупок.
 
         """
         user = self.request.user
-        if not user.carts.exists():
+        has_items, updated, fingerprint = shopping_cart_state(user)
+        if not has_items:
             return Response(status=HTTP_400_BAD_REQUEST)
 
-        filename = f"{user.username}_shopping_list.txt"
-        shopping_list = create_shoping_list(user)
-        response = HttpResponse(
-            shopping_list, content_type="text.txt; charset=utf-8"
+        renderer = request.accepted_renderer
+        etag = quote_etag(f"{fingerprint}-{renderer.format}")
+        last_modified = int(updated.timestamp())
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = StreamingHttpResponse(
+            renderer.stream(shopping_cart_ingredients(user), user),
+            content_type=content_type,
         )
+        filename = f"{user.username}_shopping_list.{renderer.format}"
         response["Content-Disposition"] = f"attachment; filename={filename}"
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
         return response
@@ -0,0 +1,309 @@
+from hashlib import md5
+from threading import Lock
+from time import monotonic, time_ns
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Callable, Mapping, NamedTuple
+
+from core.search import PrefixIndex
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+if TYPE_CHECKING:
+    from recipes.models import Tag
+
+INGREDIENTS_VERSION_KEY = "ingredients:version"
+TAGS_VERSION_KEY = "tags:version"
+RECIPES_VERSION_KEY = "recipes:version"
+USER_VERSION_KEY = "users:{}:version"
+COUNT_KEY = "count:{}:{}:{}"
+INGREDIENTS_KEY = "ingredients:search:{}:{}"
+METRICS_KEY = "metrics:{}"
+
+
+class TagSnapshot(NamedTuple):
+    """
+    Неизменяемый снимок каталога тегов.
+
+    :param tags: Теги в порядке сортировки модели.
+    :param by_id: Теги по ID.
+    :param by_slug: Теги по слагу.
+    """
+
+    tags: tuple["Tag", ...]
+    by_id: Mapping[int, "Tag"]
+    by_slug: Mapping[str, "Tag"]
+
+
+_ingredient_index: PrefixIndex | None = None
+_ingredient_index_version: int | None = None
+_ingredient_index_built = 0.0
+_ingredient_index_lock = Lock()
+_tag_snapshot: TagSnapshot | None = None
+_tag_snapshot_version: int | None = None
+_tag_snapshot_built = 0.0
+_tag_snapshot_lock = Lock()
+
+
+def get_version(key: str) -> int:
+    """
+    Возвращает текущую версию данных, хранящуюся в кэше под ключом key.
+
+    Если версии в кэше нет (кэш очищен или перезапущен), создается новая
+    на основе текущего времени, чтобы она не совпала ни с одной из
+    ранее выданных версий.
+
+    :param key: Ключ версии.
+    :return: Номер версии.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key: str) -> None:
+    """
+    Увеличивает версию данных.
+
+    Все записи кэша, созданные для предыдущей версии,
+    перестают использоваться и вытесняются по таймауту.
+
+    :param key: Ключ версии.
+    :return: None
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time_ns(), timeout=None)
+
+
+def cache_is_shared() -> bool:
+    """
+    Проверяет, общий ли кэш для всех процессов.
+
+    Кэш в памяти процесса (LocMem) и фиктивный кэш не видны другим
+    процессам: версии и счетчики, измененные, например, командой
+    управления, не доходят до веб-воркеров.
+
+    :return: False для локальных бэкендов кэша.
+    """
+    return not isinstance(
+        caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)
+    )
+
+
+def get_ingredients_version() -> int:
+    """
+    Возвращает текущую версию каталога ингредиентов.
+    """
+    return get_version(INGREDIENTS_VERSION_KEY)
+
+
+def bump_ingredients_version() -> None:
+    """
+    Увеличивает версию каталога ингредиентов.
+    """
+    bump_version(INGREDIENTS_VERSION_KEY)
+
+
+def bump_tags_version() -> None:
+    """
+    Увеличивает версию каталога тегов.
+    """
+    bump_version(TAGS_VERSION_KEY)
+
+
+def bump_recipes_version() -> None:
+    """
+    Увеличивает версию рецептов: сбрасывает кэшированные количества
+    рецептов для всех пользователей.
+    """
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def bump_user_version(user_id: int) -> None:
+    """
+    Увеличивает версию данных пользователя (избранное, корзина,
+    подписки): сбрасывает кэшированные количества, зависящие
+    от пользователя.
+
+    :param user_id: ID пользователя.
+    :return: None
+    """
+    bump_version(USER_VERSION_KEY.format(user_id))
+
+
+def cached_count(
+    scope: str, user_id: int | None, compute: Callable[[], int]
+) -> int:
+    """
+    Возвращает количество объектов из кэша.
+
+    Ключ включает версию рецептов и, если задан user_id, ID и версию
+    данных пользователя, поэтому количества разных пользователей
+    не смешиваются и после изменения данных пересчитываются.
+
+    :param scope: Часть ключа, описывающая запрос
+        (путь и нормализованные параметры фильтрации).
+    :param user_id: ID пользователя, если количество зависит от него.
+    :param compute: Функция, вычисляющая количество при промахе кэша.
+    :return: Количество объектов.
+    """
+    versions = [get_version(RECIPES_VERSION_KEY)]
+    if user_id is not None:
+        versions.append(get_version(USER_VERSION_KEY.format(user_id)))
+
+    key = COUNT_KEY.format(
+        "all" if user_id is None else user_id,
+        ".".join(map(str, versions)),
+        md5(scope.encode()).hexdigest(),
+    )
+    count = cache.get(key)
+    if count is None:
+        count = compute()
+        cache.set(key, count, timeout=settings.COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def cached_ingredients(query: str, compute: Callable[[], Any]) -> Any:
+    """
+    Возвращает результат поиска ингредиентов из кэша.
+
+    Ключ включает версию каталога и хеш поискового запроса (ключ
+    допустим для любого бэкенда кэша), поэтому после изменения
+    ингредиентов устаревшие данные не отдаются.
+
+    :param query: Поисковый запрос (пустая строка - весь каталог).
+    :param compute: Функция, вычисляющая данные при промахе кэша.
+    :return: Сериализованные данные.
+    """
+    key = INGREDIENTS_KEY.format(
+        get_ingredients_version(), md5(query.encode()).hexdigest()
+    )
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, timeout=settings.INGREDIENTS_CACHE_TIMEOUT)
+    return data
+
+
+def get_ingredient_index() -> PrefixIndex:
+    """
+    Возвращает поисковый индекс ингредиентов текущего процесса.
+
+    Индекс строится при первом обращении и перестраивается,
+    когда меняется версия каталога ингредиентов или истекает
+    `LOCAL_SNAPSHOT_TTL` (см. `get_tag_snapshot`).
+
+    :return: Индекс с сериализованными ингредиентами.
+    """
+    global _ingredient_index, _ingredient_index_version
+    global _ingredient_index_built
+
+    version = get_ingredients_version()
+    if _ingredient_index is not None and _is_fresh(
+        version, _ingredient_index_version, _ingredient_index_built
+    ):
+        return _ingredient_index
+
+    with _ingredient_index_lock:
+        if _ingredient_index is None or not _is_fresh(
+            version, _ingredient_index_version, _ingredient_index_built
+        ):
+            Ingredient = apps.get_model("recipes", "Ingredient")
+            _ingredient_index = PrefixIndex(
+                Ingredient.objects.values("id", "name", "measurement_unit")
+            )
+            _ingredient_index_version = version
+            _ingredient_index_built = monotonic()
+
+    return _ingredient_index
+
+
+def _is_fresh(version: int, built_version: int | None, built: float) -> bool:
+    """
+    Проверяет, актуален ли снимок в памяти процесса: версия в кэше
+    не менялась и снимок не старше `LOCAL_SNAPSHOT_TTL` секунд.
+
+    :param version: Текущая версия данных в кэше.
+    :param built_version: Версия, по которой построен снимок.
+    :param built: Время построения снимка (`time.monotonic`).
+    :return: True, если снимок можно использовать.
+    """
+    return (
+        built_version == version
+        and monotonic() - built < settings.LOCAL_SNAPSHOT_TTL
+    )
+
+
+def get_tag_snapshot() -> TagSnapshot:
+    """
+    Возвращает снимок каталога тегов текущего процесса.
+
+    Снимок строится при первом обращении и перестраивается,
+    когда меняется версия каталога тегов или истекает
+    `LOCAL_SNAPSHOT_TTL`. Версия хранится в общем кэше (Redis),
+    поэтому изменение тега в одном воркере сразу обновляет снимки
+    во всех. Срок жизни ограничивает устаревание, если версия другим
+    процессам не видна (кэш в памяти процесса).
+
+    Теги снимка общие для всех запросов и не должны изменяться.
+
+    :return: Снимок каталога тегов.
+    """
+    global _tag_snapshot, _tag_snapshot_version, _tag_snapshot_built
+
+    version = get_version(TAGS_VERSION_KEY)
+    if _tag_snapshot is not None and _is_fresh(
+        version, _tag_snapshot_version, _tag_snapshot_built
+    ):
+        return _tag_snapshot
+
+    with _tag_snapshot_lock:
+        if _tag_snapshot is None or not _is_fresh(
+            version, _tag_snapshot_version, _tag_snapshot_built
+        ):
+            Tag = apps.get_model("recipes", "Tag")
+            tags = tuple(Tag.objects.all())
+            _tag_snapshot = TagSnapshot(
+                tags=tags,
+                by_id=MappingProxyType({tag.pk: tag for tag in tags}),
+                by_slug=MappingProxyType({tag.slug: tag for tag in tags}),
+            )
+            _tag_snapshot_version = version
+            _tag_snapshot_built = monotonic()
+
+    return _tag_snapshot
+
+
+def incr_metric(name: str) -> None:
+    """
+    Увеличивает счетчик метрики на единицу.
+
+    Счетчики хранятся в кэше, поэтому при общем бэкенде (Redis)
+    они суммируются по всем воркерам.
+
+    :param name: Название метрики.
+    :return: None
+    """
+    key = METRICS_KEY.format(name)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def get_metrics(*names: str) -> dict[str, int]:
+    """
+    Возвращает значения счетчиков метрик.
+
+    :param names: Названия метрик.
+    :return: Словарь, где ключи - названия метрик, значения - счетчики.
+    """
+    values = cache.get_many([METRICS_KEY.format(name) for name in names])
+    return {name: values.get(METRICS_KEY.format(name), 0) for name in names}
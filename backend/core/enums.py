@@ -3,6 +3,9 @@ from enum import Enum, IntEnum
 
 class Tuples(tuple, Enum):
     RECIPE_IMAGE_SIZE = 500, 500
+    RECIPE_IMAGE_RENDITIONS = ("thumb", 160), ("card", 320), ("full", 500)
+    RECIPE_IMAGE_FORMATS = "avif", "webp", "jpeg"
+    RECIPE_IMAGE_UPLOAD_FORMATS = "jpeg", "png", "gif", "webp"
     SYMBOL_TRUE_SEARCH = "1", "true"
     SYMBOL_FALSE_SEARCH = "0", "false"
 
@@ -18,6 +21,11 @@ class Limits(IntEnum):
     MAX_COOKING_TIME = 300
     MIN_AMOUNT_INGREDIENTS = 1
     MAX_AMOUNT_INGREDIENTS = 32
+    # Верхняя граница PositiveSmallIntegerField `AmountIngredient.amount`.
+    MAX_AMOUNT_STORED = 32767
+    MAX_IMAGE_SIZE = 5 * 1024 ** 2
+    MAX_IMAGE_PIXELS = 25_000_000
+    MAX_BULK_RECIPES = 500
 
 
 class UrlQueries(str, Enum):
@@ -26,3 +34,10 @@ class UrlQueries(str, Enum):
     SHOP_CART = "is_in_shopping_cart"
     AUTHOR = "author"
     TAGS = "tags"
+    SEARCH_RECIPE = "search"
+
+
+class Metrics(str, Enum):
+    INGREDIENT_SEARCH = "ingredient_search"
+    LAYOUT_FALLBACK = "ingredient_search_layout_fallback"
+    LAYOUT_FALLBACK_FOUND = "ingredient_search_layout_fallback_found"
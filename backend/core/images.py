@@ -0,0 +1,296 @@
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+from queue import Queue
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Iterable
+
+from core.enums import Tuples
+from core.storage import (
+    DerivedContentFile,
+    lock_file,
+    recipe_image_storage,
+)
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from PIL import Image
+
+if TYPE_CHECKING:
+    from recipes.models import Recipe
+
+IMAGE_EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+
+logger = logging.getLogger(__name__)
+
+_jobs_queue: "Queue[int]" = Queue()
+_worker: Thread | None = None
+_worker_lock = Lock()
+
+
+def normalize_image(name: str) -> str:
+    """
+    Уменьшает изображение до `Tuples.RECIPE_IMAGE_SIZE`.
+
+    Результат сохраняется новым файлом: в хранилище с адресацией
+    по содержимому файлы не перезаписываются.
+
+    :param name: Имя файла в хранилище изображений рецептов.
+    :return: Имя уменьшенного изображения.
+    """
+    buffer = BytesIO()
+    with recipe_image_storage.open(name) as file, Image.open(file) as image:
+        image_format = image.format
+        image.thumbnail(Tuples.RECIPE_IMAGE_SIZE)
+        image.save(buffer, image_format)
+    return recipe_image_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def rendition_formats() -> list[str]:
+    """
+    Возвращает форматы вариантов изображения, которые умеет сохранять
+    установленный Pillow (AVIF - только с соответствующим плагином).
+    """
+    Image.init()
+    return [
+        image_format
+        for image_format in Tuples.RECIPE_IMAGE_FORMATS
+        if image_format.upper() in Image.SAVE
+    ]
+
+
+def rendition_name(name: str, label: str, image_format: str) -> str:
+    """
+    Возвращает имя файла варианта изображения:
+    `recipe_images/<имя>_<вариант>.<расширение>`.
+    """
+    source = PurePosixPath(name)
+    return str(
+        source.with_name(
+            f"{source.stem}_{label}.{IMAGE_EXTENSIONS[image_format]}"
+        )
+    )
+
+
+def _save_rendition(name: str, image: Image.Image, image_format: str) -> str:
+    """
+    Сохраняет вариант изображения в хранилище под именем name.
+
+    :return: Имя сохраненного файла.
+    """
+    if image_format == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, image_format)
+    return recipe_image_storage.save(
+        name, DerivedContentFile(buffer.getvalue())
+    )
+
+
+def make_renditions(name: str) -> dict[str, list[tuple[str, int]]]:
+    """
+    Создает уменьшенные копии изображения в нескольких форматах.
+
+    Файлы сохраняются через хранилище рядом с оригиналом
+    (`rendition_name`). Имя оригинала задается его содержимым, поэтому
+    уже существующие варианты повторно не записываются.
+
+    :param name: Имя исходного файла в хранилище изображений рецептов.
+    :return: Словарь, где ключи - форматы, значения - списки пар
+        (имя файла, ширина) по возрастанию ширины.
+    """
+    renditions = {}
+
+    with recipe_image_storage.open(name) as file, Image.open(file) as original:
+        original.load()
+        for image_format in rendition_formats():
+            files = []
+            for label, size in Tuples.RECIPE_IMAGE_RENDITIONS:
+                rendition = rendition_name(name, label, image_format)
+                image = original.copy()
+                image.thumbnail((size, size))
+                if not recipe_image_storage.exists(rendition):
+                    rendition = _save_rendition(rendition, image, image_format)
+                files.append((rendition, image.width))
+            renditions[image_format] = files
+
+    return renditions
+
+
+def delete_image_files(name: str) -> None:
+    """
+    Удаляет файл изображения и все его варианты.
+
+    :param name: Имя файла в хранилище изображений рецептов.
+    :return: None
+    """
+    recipe_image_storage.delete(name)
+    for image_format in IMAGE_EXTENSIONS:
+        for label, _ in Tuples.RECIPE_IMAGE_RENDITIONS:
+            recipe_image_storage.delete(
+                rendition_name(name, label, image_format)
+            )
+
+
+def release_images(*names: str) -> None:
+    """
+    После фиксации транзакции удаляет изображения, на которые
+    больше не ссылается ни один рецепт, вместе с их вариантами.
+
+    Число ссылок на файл - количество рецептов с этим изображением,
+    оно проверяется запросом в момент удаления под блокировкой
+    `lock_file`. Транзакция, сохранившая этот же файл для другого
+    рецепта, удерживает блокировку до фиксации, поэтому проверка
+    видит новую ссылку и файл не удаляется.
+
+    :param names: Имена файлов, которые перестали использоваться
+        одним из рецептов.
+    :return: None
+    """
+    names = {name for name in names if name}
+    if not names:
+        return
+
+    def release() -> None:
+        Recipe = apps.get_model("recipes", "Recipe")
+        for name in sorted(names):
+            with transaction.atomic():
+                lock_file(name)
+                if not Recipe.objects.filter(image=name).exists():
+                    delete_image_files(name)
+
+    transaction.on_commit(release)
+
+
+def process_image_job(job_id: int) -> bool:
+    """
+    Выполняет задачу обработки изображения: уменьшает оригинал
+    и создает его варианты (`make_renditions`). Рецепт переключается
+    на уменьшенное изображение, оригинал освобождается.
+
+    Задача блокируется на время выполнения, поэтому ее не возьмут
+    одновременно фоновый поток и команда `processimages`. Если
+    выполнение прервано исключением, транзакция отменяется, а задача
+    отдельным запросом помечается как завершенная с ошибкой, чтобы
+    она не выполнялась повторно; исключение передается дальше.
+
+    :param job_id: ID задачи.
+    :return: True, если задача была выполнена этим вызовом.
+    """
+    ImageJob = apps.get_model("recipes", "ImageJob")
+
+    try:
+        return _process_image_job(job_id)
+    except Exception as error:
+        ImageJob.objects.filter(
+            pk=job_id, status=ImageJob.Status.PENDING
+        ).update(
+            status=ImageJob.Status.FAILED,
+            error=f"{type(error).__name__}: {error}",
+        )
+        raise
+
+
+def _process_image_job(job_id: int) -> bool:
+    """
+    Выполняет задачу обработки изображения в одной транзакции
+    (см. `process_image_job`).
+    """
+    ImageJob = apps.get_model("recipes", "ImageJob")
+
+    with transaction.atomic():
+        job = (
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(pk=job_id, status=ImageJob.Status.PENDING)
+            .first()
+        )
+        if job is None:
+            return False
+
+        try:
+            image = normalize_image(job.image)
+            renditions = make_renditions(image)
+        except (OSError, ValueError) as error:
+            job.status = ImageJob.Status.FAILED
+            job.error = str(error)
+        else:
+            job.status = ImageJob.Status.DONE
+            Recipe = apps.get_model("recipes", "Recipe")
+            Recipe.objects.filter(pk=job.recipe_id, image=job.image).update(
+                image=image, renditions=renditions
+            )
+            if image != job.image:
+                release_images(job.image, image)
+        job.save(update_fields=("status", "error"))
+
+    return True
+
+
+def _work() -> None:
+    """
+    Цикл фонового потока: выполняет задачи из очереди процесса.
+    """
+    while True:
+        job_id = _jobs_queue.get()
+        try:
+            close_old_connections()
+            process_image_job(job_id)
+        except Exception:
+            logger.exception("Image job %s failed", job_id)
+        finally:
+            connection.close()
+            _jobs_queue.task_done()
+
+
+def _submit(job_id: int) -> None:
+    """
+    Передает задачу фоновому потоку, запуская его при необходимости.
+    """
+    global _worker
+
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = Thread(target=_work, name="image-jobs", daemon=True)
+            _worker.start()
+    _jobs_queue.put(job_id)
+
+
+def enqueue_image_jobs(recipes: "Iterable[Recipe]") -> None:
+    """
+    Ставит изображения рецептов в очередь на обработку.
+
+    Задачи сохраняются в базе данных одним запросом, а после фиксации
+    транзакции передаются фоновому потоку процесса (если
+    `IMAGE_WORKER_THREAD` включен). Очередь потока хранится в памяти,
+    поэтому задачи, не выполненные до перезапуска процесса, и задачи
+    при выключенном потоке выполняет команда `processimages --loop`
+    (сервис `images` в `infra/docker-compose.yml`).
+
+    :param recipes: Рецепты с новыми изображениями.
+    :return: None
+    """
+    ImageJob = apps.get_model("recipes", "ImageJob")
+    jobs = ImageJob.objects.bulk_create(
+        ImageJob(recipe=recipe, image=recipe.image.name) for recipe in recipes
+    )
+
+    if not settings.IMAGE_WORKER_THREAD:
+        return
+
+    def submit() -> None:
+        for job in jobs:
+            _submit(job.pk)
+
+    transaction.on_commit(submit)
+
+
+def enqueue_image_job(recipe: "Recipe") -> None:
+    """
+    Ставит изображение рецепта в очередь на обработку
+    (см. `enqueue_image_jobs`).
+
+    :param recipe: Рецепт с новым изображением.
+    :return: None
+    """
+    enqueue_image_jobs((recipe,))
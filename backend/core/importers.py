@@ -0,0 +1,71 @@
+import csv
+import json
+from itertools import islice
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+CSV_HEADER = ("name", "measurement_unit")
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """
+    Разбивает последовательность на пакеты фиксированного размера.
+
+    :param items: Исходная последовательность (может быть генератором).
+    :param size: Размер пакета.
+    :return: Генератор списков длиной не больше size.
+    """
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def read_csv_rows(path: str) -> Iterator[tuple[str, str]]:
+    """
+    Построчно читает ингредиенты из CSV-файла.
+
+    Ожидаются строки вида `название,единица измерения`.
+    Строка-заголовок и неполные строки пропускаются.
+
+    :param path: Путь к файлу.
+    :return: Генератор пар (название, единица измерения).
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            name, measurement_unit = row[0].strip(), row[1].strip()
+            if (name, measurement_unit) == CSV_HEADER:
+                continue
+            if name and measurement_unit:
+                yield name, measurement_unit
+
+
+def read_ndjson_rows(path: str) -> Iterator[tuple[str, str]]:
+    """
+    Построчно читает ингредиенты из файла JSON Lines.
+
+    Каждая строка - объект с ключами `name` и `measurement_unit`.
+    Пустые строки и объекты без этих ключей пропускаются.
+
+    :param path: Путь к файлу.
+    :return: Генератор пар (название, единица измерения).
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            name = str(data.get("name", "")).strip()
+            measurement_unit = str(data.get("measurement_unit", "")).strip()
+            if name and measurement_unit:
+                yield name, measurement_unit
+
+
+ROW_READERS = {
+    "csv": read_csv_rows,
+    "jsonl": read_ndjson_rows,
+    "ndjson": read_ndjson_rows,
+}
@@ -0,0 +1,95 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Iterable
+
+TRIGRAM_LEN = 3
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Разбивает строку на множество триграмм.
+
+    :param text: Исходная строка.
+    :return: Множество подстрок длины `TRIGRAM_LEN`.
+    """
+    return {
+        text[i:i + TRIGRAM_LEN] for i in range(len(text) - TRIGRAM_LEN + 1)
+    }
+
+
+class PrefixIndex:
+    """
+    Индекс в памяти процесса для поиска по началу и по подстроке.
+
+    Записи хранятся отсортированными по ключу, поэтому совпадения
+    по началу строки находятся двоичным поиском. Для поиска подстроки
+    используется триграммный индекс: кандидаты - пересечение списков
+    позиций для всех триграмм запроса.
+
+    В результатах сначала идут совпадения по началу строки,
+    затем - по подстроке, внутри групп - по алфавиту.
+
+    :param entries: Записи индекса (словари).
+    :param field: Имя поля записи, по которому выполняется поиск.
+    """
+
+    def __init__(self, entries: Iterable[dict], field: str = "name") -> None:
+        self._entries = sorted(entries, key=lambda entry: entry[field].lower())
+        self._keys = [entry[field].lower() for entry in self._entries]
+        self._trigrams: dict[str, list[int]] = defaultdict(list)
+
+        for pos, key in enumerate(self._keys):
+            for gram in trigrams(key):
+                self._trigrams[gram].append(pos)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _prefix_range(self, query: str) -> range:
+        """
+        Возвращает диапазон позиций ключей, начинающихся с query.
+        """
+        start = bisect_left(self._keys, query)
+        stop = bisect_left(self._keys, query + chr(0x10FFFF), lo=start)
+        return range(start, stop)
+
+    def _substring_positions(self, query: str) -> list[int]:
+        """
+        Возвращает отсортированные позиции ключей, содержащих query.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return [
+                pos for pos, key in enumerate(self._keys) if query in key
+            ]
+
+        postings = sorted(
+            (self._trigrams.get(gram, ()) for gram in grams), key=len
+        )
+        candidates = set(postings[0])
+        for positions in postings[1:]:
+            candidates.intersection_update(positions)
+            if not candidates:
+                return []
+
+        return sorted(pos for pos in candidates if query in self._keys[pos])
+
+    def search(self, query: str) -> list[dict]:
+        """
+        Ищет записи, ключ которых содержит query.
+
+        :param query: Поисковый запрос. Пустой запрос возвращает все записи.
+        :return: Список найденных записей.
+        """
+        query = query.strip().lower()
+        if not query:
+            return list(self._entries)
+
+        prefix = self._prefix_range(query)
+        result = [self._entries[pos] for pos in prefix]
+        result.extend(
+            self._entries[pos]
+            for pos in self._substring_positions(query)
+            if pos not in prefix
+        )
+        return result
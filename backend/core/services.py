@@ -1,66 +1,837 @@
+import csv
 from datetime import datetime as dt
-from typing import TYPE_CHECKING
+from functools import partial, reduce
+from io import StringIO
+from operator import or_
+from typing import TYPE_CHECKING, Iterable, Iterator
 from urllib.parse import unquote
 
+from core.cache import (
+    bump_recipes_version,
+    bump_user_version,
+    cached_ingredients,
+    get_ingredient_index,
+    get_ingredients_version,
+    incr_metric,
+)
+from core.enums import Metrics
+from core.images import enqueue_image_jobs
+from core.importers import batched
 from django.apps import apps
-from django.db.models import F, Sum
-from foodgram.settings import DATE_TIME_FORMAT
+from django.db import connection, transaction
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    IntegerField,
+    Model,
+    Q,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import Greatest, RowNumber
+from django.db.models.signals import post_delete, post_save
+from django.db.transaction import atomic
+from django.utils import timezone
 from recipes.models import AmountIngredient, Recipe
 
 if TYPE_CHECKING:
-    from recipes.models import Ingredient
     from users.models import MyUser
 
 
 def recipe_ingredients_set(
-    recipe: Recipe, ingredients: dict[int, tuple["Ingredient", int]]
+    recipe: Recipe, ingredients: dict[int, int]
 ) -> None:
     """
     Добавляет ингредиенты в рецепт.
 
     :param recipe: Рецепт, в который добавляются ингредиенты.
     :param ingredients: Словарь с ингредиентами и их количеством.
-        Ключи - это ID ингредиентов,
-        значения - кортежи (Ингредиент, количество).
+        Ключи - это ID ингредиентов, значения - количества
+        (см. `recipe_relations_validator`).
     :return: None
     """
-    objs = []
+    AmountIngredient.objects.bulk_create(
+        AmountIngredient(
+            recipe=recipe, ingredients_id=ingredient_id, amount=amount
+        )
+        for ingredient_id, amount in ingredients.items()
+    )
+
+
+def recipe_ingredients_update(
+    recipe: Recipe, ingredients: dict[int, int]
+) -> dict[int, int]:
+    """
+    Приводит ингредиенты рецепта к новому составу, изменяя только
+    отличающиеся строки: новые добавляются, лишние удаляются,
+    у оставшихся обновляется количество (`bulk_update`).
+
+    :param recipe: Изменяемый рецепт.
+    :param ingredients: Словарь, где ключи - ID ингредиентов,
+        значения - новые количества.
+    :return: Количество ингредиентов до изменения
+        (для `cart_totals_recipe_changed`).
+    """
+    rows = {
+        row.ingredients_id: row
+        for row in AmountIngredient.objects.filter(recipe=recipe).only(
+            "id", "ingredients_id", "amount"
+        )
+    }
+    old_amounts = {
+        ingredient_id: row.amount for ingredient_id, row in rows.items()
+    }
+
+    to_delete = [
+        row.pk
+        for ingredient_id, row in rows.items()
+        if ingredient_id not in ingredients
+    ]
+    to_update = []
+    for ingredient_id, amount in ingredients.items():
+        row = rows.get(ingredient_id)
+        if row is not None and row.amount != amount:
+            row.amount = amount
+            to_update.append(row)
 
-    for ingredient, amount in ingredients.values():
-        objs.append(
+    if to_delete:
+        AmountIngredient.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        AmountIngredient.objects.bulk_update(to_update, ("amount",))
+    recipe_ingredients_set(
+        recipe,
+        {
+            ingredient_id: amount
+            for ingredient_id, amount in ingredients.items()
+            if ingredient_id not in rows
+        },
+    )
+    return old_amounts
+
+
+@atomic
+def bulk_create_recipes(
+    recipes: list[dict], batch_size: int = 100
+) -> list[Recipe]:
+    """
+    Создает рецепты пакетами в одной транзакции.
+
+    На каждый пакет выполняется по одному INSERT для рецептов, их тэгов
+    и ингредиентов. Изображения сохраняются в хранилище при вставке
+    рецептов, задачи на их обработку ставятся одним запросом.
+    Сигналы `post_save` при этом не отправляются, поэтому кэш
+    количества рецептов сбрасывается явно.
+
+    :param recipes: Проверенные данные рецептов (`validated_data`
+        `RecipeSerializer`) с полями `tags` - список тэгов
+        и `ingredients` - словарь {ID ингредиента: количество}.
+    :param batch_size: Количество рецептов в одном пакете.
+    :return: Созданные рецепты в порядке данных.
+    """
+    TagsThrough = Recipe.tags.through
+    created = []
+
+    for batch in batched(recipes, batch_size):
+        objs = Recipe.objects.bulk_create(
+            Recipe(
+                **{
+                    field: value
+                    for field, value in data.items()
+                    if field not in ("tags", "ingredients")
+                }
+            )
+            for data in batch
+        )
+        TagsThrough.objects.bulk_create(
+            TagsThrough(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe, data in zip(objs, batch)
+            for tag in data["tags"]
+        )
+        AmountIngredient.objects.bulk_create(
             AmountIngredient(
-                recipe=recipe, ingredients=ingredient, amount=amount
+                recipe_id=recipe.pk,
+                ingredients_id=ingredient_id,
+                amount=amount,
             )
+            for recipe, data in zip(objs, batch)
+            for ingredient_id, amount in data["ingredients"].items()
         )
+        enqueue_image_jobs(objs)
+        created.extend(objs)
 
-    AmountIngredient.objects.bulk_create(objs)
+    transaction.on_commit(bump_recipes_version)
+    return created
 
 
-def create_shoping_list(user: "MyUser") -> str:
+@atomic
+def bulk_import_ingredients(
+    rows: Iterable[tuple[str, str]], batch_size: int = 1000
+) -> tuple[int, int]:
     """
-    Создает список покупок для пользователя.
+    Добавляет ингредиенты в базу данных пакетами в одной транзакции.
 
-    :param user: Пользователь, для которого создается список покупок.
-    :return: Строка с созданным списком покупок.
+    Существующие пары (название, единица измерения) загружаются
+    одним запросом, сравнение с импортируемыми строками выполняется
+    в памяти, повторы внутри импорта пропускаются.
+
+    :param rows: Пары (название, единица измерения).
+    :param batch_size: Количество строк в одном INSERT.
+    :return: Кортеж (добавлено, пропущено).
     """
-    shopping_list = [
-        f"Список покупок для:\n\n{user.first_name}\n"
-        f"{dt.now().strftime(DATE_TIME_FORMAT)}\n"
-    ]
     Ingredient = apps.get_model("recipes", "Ingredient")
-    ingredients = (
-        Ingredient.objects.filter(recipe__recipe__in_carts__user=user)
-        .values("name", measurement=F("measurement_unit"))
-        .annotate(amount=Sum("recipe__amount"))
+    existing = set(Ingredient.objects.values_list("name", "measurement_unit"))
+    new_ingredients = []
+    skipped = 0
+
+    for name, measurement_unit in rows:
+        if (name, measurement_unit) in existing:
+            skipped += 1
+            continue
+        existing.add((name, measurement_unit))
+        new_ingredients.append(
+            Ingredient(name=name, measurement_unit=measurement_unit)
+        )
+
+    Ingredient.objects.bulk_create(
+        new_ingredients, batch_size=batch_size, ignore_conflicts=True
     )
-    ing_list = (
-        f'{ing["name"]}: {ing["amount"]} {ing["measurement"]}'
-        for ing in ingredients
+    return len(new_ingredients), skipped
+
+
+def _fit_ingredient_rows(
+    rows: Iterable[tuple[str, str]]
+) -> Iterable[tuple[str, str]]:
+    """
+    Отбрасывает строки, не помещающиеся в поля модели Ingredient.
+    """
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    max_name = Ingredient._meta.get_field("name").max_length
+    max_unit = Ingredient._meta.get_field("measurement_unit").max_length
+    return (
+        (name, unit)
+        for name, unit in rows
+        if len(name) <= max_name and len(unit) <= max_unit
     )
-    shopping_list.extend(ing_list)
 
-    shopping_list.append("\nПосчитано в Foodgram")
-    return "\n".join(shopping_list)
+
+@atomic
+def stream_import_ingredients(
+    rows: Iterable[tuple[str, str]], batch_size: int = 1000
+) -> tuple[int, int]:
+    """
+    Потоково добавляет ингредиенты в базу данных в одной транзакции.
+
+    Строки читаются из генератора и записываются пакетами фиксированного
+    размера, поэтому расход памяти не зависит от размера файла.
+    Дубликаты отбрасываются базой данных по ограничению уникальности.
+
+    :param rows: Пары (название, единица измерения).
+    :param batch_size: Количество строк в одном INSERT.
+    :return: Кортеж (добавлено, пропущено).
+    """
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    count_before = Ingredient.objects.count()
+    total = 0
+
+    for batch in batched(rows, batch_size):
+        total += len(batch)
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in _fit_ingredient_rows(batch)
+            ),
+            ignore_conflicts=True,
+        )
+
+    inserted = Ingredient.objects.count() - count_before
+    return inserted, total - inserted
+
+
+@atomic
+def copy_import_ingredients(
+    rows: Iterable[tuple[str, str]], batch_size: int = 10000
+) -> tuple[int, int]:
+    """
+    Добавляет ингредиенты через `COPY` во временную таблицу (PostgreSQL).
+
+    Строки пакетами копируются во временную таблицу, затем переносятся
+    в таблицу ингредиентов одним `INSERT ... ON CONFLICT DO NOTHING`.
+
+    :param rows: Пары (название, единица измерения).
+    :param batch_size: Количество строк в одном пакете `COPY`.
+    :return: Кортеж (добавлено, пропущено).
+    """
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    table = Ingredient._meta.db_table
+    total = 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE ingredient_staging "
+            "(name text, measurement_unit text) ON COMMIT DROP"
+        )
+        for batch in batched(rows, batch_size):
+            total += len(batch)
+            buffer = StringIO()
+            csv.writer(buffer).writerows(_fit_ingredient_rows(batch))
+            buffer.seek(0)
+            cursor.copy_expert(
+                "COPY ingredient_staging (name, measurement_unit) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        cursor.execute(
+            f"INSERT INTO {table} (name, measurement_unit) "
+            "SELECT DISTINCT name, measurement_unit FROM ingredient_staging "
+            "ON CONFLICT DO NOTHING"
+        )
+        inserted = cursor.rowcount
+
+    return inserted, total - inserted
+
+
+def recipes_by_authors(
+    authors_ids: list[int], limit: int | None = None
+) -> dict[int, list[Recipe]]:
+    """
+    Загружает рецепты нескольких авторов одним запросом.
+
+    Для каждого автора оставляет не более `limit` последних рецептов,
+    нумеруя их оконной функцией `ROW_NUMBER() OVER (PARTITION BY author_id)`.
+
+    :param authors_ids: Список ID авторов.
+    :param limit: Максимальное количество рецептов на автора.
+        Если не указано - возвращаются все рецепты.
+    :return: Словарь, где ключи - ID авторов, значения - списки рецептов.
+    """
+    recipes = Recipe.objects.filter(author_id__in=authors_ids)
+
+    if limit is not None:
+        recipes = recipes.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("pub_date").desc(), F("id").desc()),
+            )
+        ).filter(row_number__lte=limit)
+
+    result = {author_id: [] for author_id in authors_ids}
+    recipes = recipes.only(
+        "id", "name", "image", "renditions", "cooking_time", "author"
+    )
+    for recipe in recipes:
+        result[recipe.author_id].append(recipe)
+
+    return result
+
+
+def estimated_count(model: type[Model]) -> int | None:
+    """
+    Возвращает оценку количества строк таблицы модели по статистике
+    планировщика PostgreSQL (`pg_class.reltuples`), без `COUNT(*)`.
+
+    :param model: Класс модели.
+    :return: Оценка количества строк или None, если база данных
+        не PostgreSQL или статистика для таблицы еще не собрана.
+    """
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            (model._meta.db_table,),
+        )
+        row = cursor.fetchone()
+
+    if row is None or row[0] <= 0:
+        return None
+    return int(row[0])
+
+
+@atomic
+def create_relation(model: type[Model], **values) -> Model | None:
+    """
+    Создает запись связи (избранное, корзина, подписка) одним запросом
+    `INSERT ... SELECT ... WHERE EXISTS ... ON CONFLICT DO NOTHING
+    RETURNING`.
+
+    Строка вставляется, только если существуют все объекты, на которые
+    она ссылается, поэтому отсутствующий рецепт или автор не приводит
+    к нарушению внешнего ключа. Повторное или одновременное добавление
+    той же связи не вызывает `IntegrityError`: запрос просто не вставляет
+    строку. Для созданной записи отправляется `post_save`, как при
+    `save()`, чтобы обработчики сигналов (списки покупок, кэш количеств)
+    выполнились в той же транзакции.
+
+    :param model: Модель связи.
+    :param values: Значения полей, например `user_id=1, recipe_id=2`.
+    :return: Созданная запись или None, если связь уже существует
+        или связываемого объекта нет.
+    """
+    opts = model._meta
+    obj = model(**values)
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+    relations = [field for field in fields if field.is_relation]
+    quote = connection.ops.quote_name
+
+    exists = " AND ".join(
+        f"EXISTS (SELECT 1 FROM {quote(field.related_model._meta.db_table)} "
+        f"WHERE {quote(field.target_field.column)} = %s)"
+        for field in relations
+    )
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} "
+        f"({', '.join(quote(field.column) for field in fields)}) "
+        f"SELECT {', '.join(['%s'] * len(fields))} WHERE {exists} "
+        f"ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)}"
+    )
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for field in fields
+    ] + [getattr(obj, field.attname) for field in relations]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    obj.pk = row[0]
+    obj._state.adding = False
+    obj._state.db = connection.alias
+    post_save.send(
+        sender=model,
+        instance=obj,
+        created=True,
+        update_fields=None,
+        raw=False,
+        using=connection.alias,
+    )
+    return obj
+
+
+@atomic
+def delete_relation(model: type[Model], **values) -> Model | None:
+    """
+    Удаляет запись связи одним запросом `DELETE ... RETURNING`.
+
+    Для удаленной записи отправляется `post_delete` (с `origin` -
+    самой записью, как при `delete()`).
+
+    :param model: Модель связи.
+    :param values: Значения полей, например `user_id=1, recipe_id=2`.
+    :return: Удаленная запись (с полями из values) или None,
+        если связи не было.
+    """
+    opts = model._meta
+    quote = connection.ops.quote_name
+
+    conditions = []
+    params = []
+    for name, value in values.items():
+        field = opts.get_field(name)
+        conditions.append(f"{quote(field.column)} = %s")
+        params.append(field.get_db_prep_value(value, connection))
+
+    sql = (
+        f"DELETE FROM {quote(opts.db_table)} "
+        f"WHERE {' AND '.join(conditions)} "
+        f"RETURNING {quote(opts.pk.column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    obj = model(pk=row[0], **values)
+    obj._state.adding = False
+    obj._state.db = connection.alias
+    post_delete.send(
+        sender=model, instance=obj, using=connection.alias, origin=obj
+    )
+    return obj
+
+
+def _add_user_recipes(
+    model: type[Model], user_id: int, recipes_ids: list[int]
+) -> list[int]:
+    """
+    Добавляет рецепты в избранное или корзину одним запросом
+    `INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING`.
+    Несуществующие рецепты и уже добавленные пропускаются.
+
+    :return: ID добавленных рецептов.
+    """
+    if not recipes_ids:
+        return []
+
+    opts = model._meta
+    quote = connection.ops.quote_name
+    obj = model(user_id=user_id)
+    extra = [
+        field
+        for field in opts.concrete_fields
+        if not field.primary_key and field.name not in ("recipe", "user")
+    ]
+    columns = [opts.get_field("recipe"), opts.get_field("user"), *extra]
+
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} "
+        f"({', '.join(quote(field.column) for field in columns)}) "
+        f"SELECT {quote(Recipe._meta.pk.column)}, "
+        f"{', '.join(['%s'] * (len(extra) + 1))} "
+        f"FROM {quote(Recipe._meta.db_table)} "
+        f"WHERE {quote(Recipe._meta.pk.column)} "
+        f"IN ({', '.join(['%s'] * len(recipes_ids))}) "
+        f"ON CONFLICT DO NOTHING "
+        f"RETURNING {quote(opts.get_field('recipe').column)}"
+    )
+    params = [
+        user_id,
+        *(
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for field in extra
+        ),
+        *recipes_ids,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _remove_user_recipes(
+    model: type[Model],
+    user_id: int,
+    recipes_ids: list[int],
+    keep: bool = False,
+) -> list[int]:
+    """
+    Удаляет рецепты из избранного или корзины одним запросом
+    `DELETE ... RETURNING`.
+
+    :param keep: Удалить все рецепты, кроме recipes_ids.
+    :return: ID удаленных рецептов.
+    """
+    if not recipes_ids and not keep:
+        return []
+
+    opts = model._meta
+    quote = connection.ops.quote_name
+    recipe_column = quote(opts.get_field("recipe").column)
+
+    sql = (
+        f"DELETE FROM {quote(opts.db_table)} "
+        f"WHERE {quote(opts.get_field('user').column)} = %s"
+    )
+    if recipes_ids:
+        sql += (
+            f" AND {recipe_column} {'NOT IN' if keep else 'IN'} "
+            f"({', '.join(['%s'] * len(recipes_ids))})"
+        )
+    sql += f" RETURNING {recipe_column}"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *recipes_ids])
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+@atomic
+def update_user_recipes(
+    model: type[Model], user_id: int, recipes_ids: list[int], mode: str
+) -> tuple[list[int], list[int]]:
+    """
+    Изменяет избранное или корзину пользователя списком рецептов.
+
+    Каждое изменение выполняется одним запросом над всем набором
+    рецептов (при замене - по одному запросу на удаление и добавление).
+    Сигналы моделей при этом не отправляются, поэтому списки покупок
+    и кэш количеств пользователя обновляются явно.
+
+    :param model: Модель `Favorites` или `Carts`.
+    :param user_id: ID пользователя.
+    :param recipes_ids: ID рецептов.
+    :param mode: "add" - добавить, "remove" - удалить,
+        "replace" - оставить ровно эти рецепты.
+    :return: Кортеж (ID добавленных рецептов, ID удаленных рецептов).
+    """
+    recipes_ids = list(dict.fromkeys(recipes_ids))
+    added, removed = [], []
+
+    if mode in ("remove", "replace"):
+        removed = _remove_user_recipes(
+            model, user_id, recipes_ids, keep=mode == "replace"
+        )
+    if mode in ("add", "replace"):
+        added = _add_user_recipes(model, user_id, recipes_ids)
+
+    if model is apps.get_model("recipes", "Carts"):
+        cart_totals_add_recipes(user_id, added)
+        cart_totals_add_recipes(user_id, removed, sign=-1)
+    if added or removed:
+        transaction.on_commit(partial(bump_user_version, user_id))
+
+    return added, removed
+
+
+def _increase_cart_totals(increments: dict[tuple[int, int], int]) -> None:
+    """
+    Увеличивает итоги списков покупок одним запросом `INSERT ...
+    ON CONFLICT (user_id, ingredient_id) DO UPDATE`: отсутствующие строки
+    создаются, существующие увеличиваются самой базой данных, поэтому
+    одновременное добавление одной строки не нарушает уникальность.
+    """
+    CartIngredientTotal = apps.get_model("recipes", "CartIngredientTotal")
+    opts = CartIngredientTotal._meta
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    user = quote(opts.get_field("user").column)
+    ingredient = quote(opts.get_field("ingredient").column)
+    total = quote(opts.get_field("total_amount").column)
+
+    sql = (
+        f"INSERT INTO {table} ({user}, {ingredient}, {total}) "
+        f"VALUES {', '.join(['(%s, %s, %s)'] * len(increments))} "
+        f"ON CONFLICT ({user}, {ingredient}) DO UPDATE "
+        f"SET {total} = {table}.{total} + EXCLUDED.{total}"
+    )
+    params = [
+        value
+        for (user_id, ingredient_id), delta in sorted(increments.items())
+        for value in (user_id, ingredient_id, delta)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _decrease_cart_totals(decrements: dict[tuple[int, int], int]) -> None:
+    """
+    Уменьшает итоги списков покупок одним запросом `UPDATE`
+    (не ниже нуля).
+    """
+    CartIngredientTotal = apps.get_model("recipes", "CartIngredientTotal")
+    conditions = [
+        (Q(user_id=user_id, ingredient_id=ingredient_id), delta)
+        for (user_id, ingredient_id), delta in sorted(decrements.items())
+    ]
+    CartIngredientTotal.objects.filter(
+        reduce(or_, (condition for condition, _ in conditions))
+    ).update(
+        total_amount=Greatest(
+            Case(
+                *(
+                    When(condition, then=F("total_amount") + delta)
+                    for condition, delta in conditions
+                ),
+                default=F("total_amount"),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def _bump_cart_versions(users_ids: Iterable[int]) -> None:
+    """
+    Увеличивает версии списков покупок пользователей одним запросом
+    `INSERT ... ON CONFLICT (user_id) DO UPDATE`.
+    """
+    CartVersion = apps.get_model("recipes", "CartVersion")
+    opts = CartVersion._meta
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    user = quote(opts.get_field("user").column)
+    version = quote(opts.get_field("version").column)
+    updated_field = opts.get_field("updated")
+    updated = quote(updated_field.column)
+    now = updated_field.get_db_prep_value(
+        timezone.now(), connection=connection
+    )
+
+    users_ids = sorted(set(users_ids))
+    sql = (
+        f"INSERT INTO {table} ({user}, {version}, {updated}) "
+        f"VALUES {', '.join(['(%s, 1, %s)'] * len(users_ids))} "
+        f"ON CONFLICT ({user}) DO UPDATE "
+        f"SET {version} = {table}.{version} + 1, "
+        f"{updated} = EXCLUDED.{updated}"
+    )
+    params = [value for user_id in users_ids for value in (user_id, now)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+@atomic
+def apply_cart_deltas(deltas: dict[tuple[int, int], int]) -> None:
+    """
+    Изменяет суммарное количество ингредиентов в списках покупок.
+
+    Итоги меняются запросами, которые складывают количества в базе
+    данных (без чтения строк), поэтому одновременные изменения
+    корзины не теряются и не нарушают уникальность строк.
+    Строки с нулевым итогом удаляются, версии списков покупок
+    затронутых пользователей (`CartVersion`) увеличиваются.
+
+    :param deltas: Словарь, где ключи - пары (ID пользователя,
+        ID ингредиента), значения - изменение количества.
+    :return: None
+    """
+    CartIngredientTotal = apps.get_model("recipes", "CartIngredientTotal")
+    increments = {key: delta for key, delta in deltas.items() if delta > 0}
+    decrements = {key: delta for key, delta in deltas.items() if delta < 0}
+
+    if increments:
+        _increase_cart_totals(increments)
+    if decrements:
+        _decrease_cart_totals(decrements)
+        CartIngredientTotal.objects.filter(
+            user_id__in={user_id for user_id, _ in decrements},
+            total_amount=0,
+        ).delete()
+    if deltas:
+        _bump_cart_versions(user_id for user_id, _ in deltas)
+
+
+def recipe_amounts(recipe_id: int) -> dict[int, int]:
+    """
+    Возвращает количество ингредиентов в рецепте.
+
+    :param recipe_id: ID рецепта.
+    :return: Словарь, где ключи - ID ингредиентов, значения - количество.
+    """
+    return dict(
+        AmountIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            "ingredients_id", "amount"
+        )
+    )
+
+
+@atomic
+def cart_totals_add_recipes(
+    user_id: int, recipes_ids: Iterable[int], sign: int = 1
+) -> None:
+    """
+    Добавляет ингредиенты рецептов в список покупок пользователя
+    (или вычитает их при sign=-1).
+
+    :param user_id: ID владельца корзины.
+    :param recipes_ids: ID рецептов, добавленных в корзину или удаленных.
+    :param sign: 1 - рецепты добавлены, -1 - удалены.
+    :return: None
+    """
+    amounts = (
+        AmountIngredient.objects.filter(recipe_id__in=recipes_ids)
+        .values("ingredients_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    apply_cart_deltas(
+        {
+            (user_id, row["ingredients_id"]): sign * row["total"]
+            for row in amounts
+        }
+    )
+
+
+@atomic
+def cart_totals_recipe_changed(
+    recipe_id: int,
+    old_amounts: dict[int, int],
+    new_amounts: dict[int, int] | None = None,
+) -> None:
+    """
+    Обновляет списки покупок всех пользователей с рецептом в корзине
+    после изменения ингредиентов рецепта.
+
+    :param recipe_id: ID рецепта.
+    :param old_amounts: Количество ингредиентов до изменения.
+    :param new_amounts: Количество ингредиентов после изменения.
+        Если не указано - загружается из базы данных.
+    :return: None
+    """
+    if new_amounts is None:
+        new_amounts = recipe_amounts(recipe_id)
+    changes = {
+        ingredient_id: new_amounts.get(ingredient_id, 0)
+        - old_amounts.get(ingredient_id, 0)
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+
+    Carts = apps.get_model("recipes", "Carts")
+    users_ids = Carts.objects.filter(recipe_id=recipe_id).values_list(
+        "user_id", flat=True
+    )
+    apply_cart_deltas(
+        {
+            (user_id, ingredient_id): delta
+            for user_id in users_ids
+            for ingredient_id, delta in changes.items()
+        }
+    )
+
+
+def shopping_cart_ingredients(user: "MyUser") -> Iterator[dict]:
+    """
+    Возвращает суммарное количество ингредиентов из корзины пользователя.
+
+    Строки читаются потоково из таблицы `CartIngredientTotal`,
+    которая поддерживается в актуальном состоянии при изменении корзины.
+
+    :param user: Пользователь, для которого создается список покупок.
+    :return: Генератор словарей с полями `name`, `measurement`, `amount`.
+    """
+    CartIngredientTotal = apps.get_model("recipes", "CartIngredientTotal")
+    return (
+        CartIngredientTotal.objects.filter(user=user)
+        .values(
+            name=F("ingredient__name"),
+            measurement=F("ingredient__measurement_unit"),
+            amount=F("total_amount"),
+        )
+        .order_by("name")
+        .iterator()
+    )
+
+
+def shopping_cart_state(
+    user: "MyUser",
+) -> tuple[bool, dt | None, str | None]:
+    """
+    Возвращает состояние списка покупок пользователя для условных запросов.
+
+    Состояние читается одним запросом к `CartVersion` без обращения
+    к рецептам: версия увеличивается при каждом изменении итогов
+    (`apply_cart_deltas`). В отпечаток также входит версия справочника
+    ингредиентов, так как в списке выводятся их названия.
+
+    :param user: Владелец корзины.
+    :return: Кортеж (есть ли ингредиенты в списке, дата изменения,
+        отпечаток состояния).
+    """
+    CartVersion = apps.get_model("recipes", "CartVersion")
+    CartIngredientTotal = apps.get_model("recipes", "CartIngredientTotal")
+    state = (
+        CartVersion.objects.filter(user=user)
+        .annotate(
+            has_items=Exists(CartIngredientTotal.objects.filter(user=user))
+        )
+        .values("version", "updated", "has_items")
+        .first()
+    )
+    if state is None:
+        return False, None, None
+
+    fingerprint = (
+        f"{user.pk}-{state['version']}-{get_ingredients_version()}"
+    )
+    return state["has_items"], state["updated"], fingerprint
 
 
 def maybe_incorrect_layout(url_string: str) -> str:
@@ -78,3 +849,52 @@ def maybe_incorrect_layout(url_string: str) -> str:
         return unquote(url_string).lower()
 
     return url_string.translate(equals).lower()
+
+
+def search_ingredients(query: str) -> tuple[list[dict], bool | None]:
+    """
+    Ищет ингредиенты по названию в индексе ингредиентов.
+
+    Если ничего не найдено, запрос повторяется в том же индексе
+    с исправленной раскладкой клавиатуры (например, "vjkjrj" -> "молоко").
+
+    :param query: Поисковый запрос.
+    :return: Кортеж (список сериализованных ингредиентов, результат
+        поиска с исправленной раскладкой: None - не выполнялся,
+        иначе - найдено ли что-нибудь).
+    """
+    index = get_ingredient_index()
+    result = index.search(query)
+    if result or not query.strip():
+        return result, None
+
+    fixed_query = maybe_incorrect_layout(query.lower())
+    if fixed_query == query.lower():
+        return result, None
+
+    result = index.search(fixed_query)
+    return result, bool(result)
+
+
+def find_ingredients(query: str) -> list[dict]:
+    """
+    Возвращает результат поиска ингредиентов (`search_ingredients`)
+    из кэша и учитывает запрос в метриках.
+
+    Метрики увеличиваются при каждом запросе, в том числе при
+    попадании в кэш: результат поиска с исправленной раскладкой
+    кэшируется вместе со списком.
+
+    :param query: Поисковый запрос (пустая строка - весь каталог).
+    :return: Список сериализованных ингредиентов.
+    """
+    result, layout_found = cached_ingredients(
+        query, lambda: search_ingredients(query)
+    )
+    if query.strip():
+        incr_metric(Metrics.INGREDIENT_SEARCH.value)
+    if layout_found is not None:
+        incr_metric(Metrics.LAYOUT_FALLBACK.value)
+    if layout_found:
+        incr_metric(Metrics.LAYOUT_FALLBACK_FOUND.value)
+    return result
@@ -1,14 +1,38 @@
-from pathlib import Path
+from functools import partial
 
-from django.db.models.signals import post_delete
+from core.cache import (
+    bump_ingredients_version,
+    bump_recipes_version,
+    bump_tags_version,
+    bump_user_version,
+)
+from core.images import release_images
+from core.services import (
+    cart_totals_add_recipes,
+    cart_totals_recipe_changed,
+    recipe_amounts,
+)
+from django.db.models import Model, QuerySet
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
 from django.dispatch import receiver
-from recipes.models import Recipe
+from recipes.models import Carts, Favorites, Ingredient, Recipe, Tag
+from users.models import Subscriptions
+
+User = get_user_model()
 
 
 @receiver(post_delete, sender=Recipe)
 def delete_image(sender: Recipe, instance: Recipe, *a, **kw) -> None:
     """
-    Удаляет изображение, связанное с рецептом, после удаления рецепта.
+    Освобождает изображение удаленного рецепта: файл и его варианты
+    удаляются, если изображение не используется другими рецептами.
 
     :param sender: Класс модели, отправляющий сигнал (Recipe в данном случае).
     :param instance: Экземпляр модели, который был удален (рецепт).
@@ -16,6 +40,144 @@ def delete_image(sender: Recipe, instance: Recipe, *a, **kw) -> None:
     :param kw: Аргументы ключевых слов.
     :return: None
     """
-    image = Path(instance.image.path)
-    if image.exists():
-        image.unlink()
+    release_images(instance.image.name)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients_cache(
+    sender: Ingredient, instance: Ingredient, *a, **kw
+) -> None:
+    """
+    Сбрасывает кэш каталога ингредиентов после фиксации изменения
+    ингредиента, чтобы воркеры не перестроили индекс
+    по незафиксированным данным.
+
+    :param sender: Класс модели, отправляющий сигнал (Ingredient).
+    :param instance: Измененный или удаленный ингредиент.
+    :param a: Позиционные аргументы.
+    :param kw: Аргументы ключевых слов.
+    :return: None
+    """
+    transaction.on_commit(bump_ingredients_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_snapshot(sender: Tag, instance: Tag, *a, **kw) -> None:
+    """
+    Обновляет снимок каталога тегов после фиксации изменения тега,
+    чтобы воркеры не перестроили снимок по незафиксированным данным.
+
+    :param sender: Класс модели, отправляющий сигнал (Tag).
+    :param instance: Измененный или удаленный тег.
+    :param a: Позиционные аргументы.
+    :param kw: Аргументы ключевых слов.
+    :return: None
+    """
+    transaction.on_commit(bump_tags_version)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_counts(sender: type, *a, **kw) -> None:
+    """
+    Сбрасывает кэшированные количества рецептов после фиксации
+    изменения рецепта, его тегов или удаления автора.
+
+    :param sender: Класс модели, отправляющий сигнал.
+    :param a: Позиционные аргументы.
+    :param kw: Аргументы ключевых слов.
+    :return: None
+    """
+    if kw.get("action", "post_").startswith("post_"):
+        transaction.on_commit(bump_recipes_version)
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_delete, sender=Favorites)
+@receiver(post_save, sender=Carts)
+@receiver(post_delete, sender=Carts)
+@receiver(post_save, sender=Subscriptions)
+@receiver(post_delete, sender=Subscriptions)
+def invalidate_user_counts(
+    sender: type, instance: Favorites | Carts | Subscriptions, *a, **kw
+) -> None:
+    """
+    Сбрасывает кэшированные количества, зависящие от пользователя,
+    после фиксации изменения его избранного, корзины или подписок.
+
+    :param sender: Класс модели, отправляющий сигнал.
+    :param instance: Добавленная или удаленная запись.
+    :param a: Позиционные аргументы.
+    :param kw: Аргументы ключевых слов.
+    :return: None
+    """
+    transaction.on_commit(partial(bump_user_version, instance.user_id))
+
+
+@receiver(post_save, sender=Carts)
+def add_to_cart_totals(
+    sender: Carts, instance: Carts, created: bool, *a, **kw
+) -> None:
+    """
+    Добавляет ингредиенты рецепта в список покупок пользователя
+    после добавления рецепта в корзину.
+
+    :param sender: Класс модели, отправляющий сигнал (Carts).
+    :param instance: Добавленная запись корзины.
+    :param created: True, если запись создана.
+    :param a: Позиционные аргументы.
+    :param kw: Аргументы ключевых слов.
+    :return: None
+    """
+    if created:
+        cart_totals_add_recipes(instance.user_id, (instance.recipe_id,))
+
+
+@receiver(post_delete, sender=Carts)
+def remove_from_cart_totals(
+    sender: Carts,
+    instance: Carts,
+    *a,
+    origin: Model | QuerySet | None = None,
+    **kw,
+) -> None:
+    """
+    Вычитает ингредиенты рецепта из списка покупок пользователя
+    после удаления рецепта из корзины.
+
+    Каскадное удаление (рецепта или пользователя) не обрабатывается:
+    рецепты учитываются в `release_recipe_from_cart_totals`,
+    а списки покупок пользователя удаляются вместе с ним.
+
+    :param sender: Класс модели, отправляющий сигнал (Carts).
+    :param instance: Удаленная запись корзины.
+    :param a: Позиционные аргументы.
+    :param origin: Объект или QuerySet, с которого началось удаление.
+    :param kw: Аргументы ключевых слов.
+    :return: None
+    """
+    if getattr(origin, "model", type(origin)) is Carts:
+        cart_totals_add_recipes(
+            instance.user_id, (instance.recipe_id,), sign=-1
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def release_recipe_from_cart_totals(
+    sender: Recipe, instance: Recipe, *a, **kw
+) -> None:
+    """
+    Вычитает ингредиенты рецепта из списков покупок всех пользователей
+    перед удалением рецепта.
+
+    :param sender: Класс модели, отправляющий сигнал (Recipe).
+    :param instance: Удаляемый рецепт.
+    :param a: Позиционные аргументы.
+    :param kw: Аргументы ключевых слов.
+    :return: None
+    """
+    cart_totals_recipe_changed(instance.pk, recipe_amounts(instance.pk), {})
@@ -0,0 +1,80 @@
+from hashlib import sha256
+from pathlib import PurePosixPath
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.utils.deconstruct import deconstructible
+
+
+def lock_file(name: str, shared: bool = False) -> None:
+    """
+    Блокирует имя файла до конца текущей транзакции
+    (`pg_advisory_xact_lock` по хешу имени).
+
+    Сохранение файла берет разделяемую блокировку, удаление -
+    исключительную, поэтому файл не удаляется, пока транзакция,
+    которая его использует, не завершена. В других базах данных
+    блокировка не выполняется.
+
+    :param name: Имя файла в хранилище.
+    :param shared: True - разделяемая блокировка.
+    :return: None
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    key = int.from_bytes(
+        sha256(name.encode()).digest()[:8], "big", signed=True
+    )
+    function = (
+        "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {function}(%s)", [key])
+
+
+class DerivedContentFile(ContentFile):
+    """
+    Содержимое файла, полученного из уже сохраненного (например,
+    вариант изображения). `ContentAddressedStorage` сохраняет его
+    под переданным именем: оно производно от адреса исходного файла.
+    """
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - хеш SHA-256 его содержимого.
+
+    Файл с уже сохраненным содержимым повторно не записывается:
+    возвращается имя существующего файла. Поэтому одинаковые
+    изображения разных рецептов хранятся один раз, а содержимое файла
+    по одному и тому же адресу никогда не меняется. Исключение -
+    `DerivedContentFile`, имя которого задает вызывающий код.
+
+    Файлы не удаляются при замене изображения рецепта: это делает
+    `core.images.release_images`, когда на файл больше не ссылается
+    ни один рецепт. Сохранение и удаление одного файла упорядочены
+    блокировкой `lock_file`.
+    """
+
+    def _save(self, name: str, content: File) -> str:
+        if not isinstance(content, DerivedContentFile):
+            digest = sha256()
+            for chunk in content.chunks():
+                digest.update(chunk)
+            content.seek(0)
+
+            path = PurePosixPath(name)
+            name = str(
+                path.with_name(digest.hexdigest() + path.suffix.lower())
+            )
+        lock_file(name, shared=True)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+recipe_image_storage = ContentAddressedStorage()
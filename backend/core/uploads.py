@@ -0,0 +1,121 @@
+import base64
+import binascii
+from tempfile import SpooledTemporaryFile
+from typing import Iterable
+
+from django.core.exceptions import ValidationError
+from PIL import Image, UnidentifiedImageError
+
+# Размер части base64-строки, декодируемой за один шаг (кратен 4).
+BASE64_CHUNK_SIZE = 64 * 1024
+# Объем файла, до которого он хранится в памяти, а не на диске.
+SPOOL_MAX_SIZE = 512 * 1024
+
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+
+def sniff_image_format(head: bytes) -> str | None:
+    """
+    Определяет формат изображения по первым байтам файла.
+
+    :param head: Начало файла (не меньше 12 байт).
+    :return: Название формата или None, если формат не распознан.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def _write_base64(
+    data: str,
+    start: int,
+    file: SpooledTemporaryFile,
+    allowed_formats: set[str],
+    chunk_size: int,
+) -> None:
+    """
+    Декодирует base64-строку в файл по частям, проверяя формат
+    изображения по первой декодированной части.
+    """
+    chunk_size -= chunk_size % 4
+    for pos in range(start, len(data), chunk_size):
+        try:
+            chunk = base64.b64decode(data[pos:pos + chunk_size], validate=True)
+        except (binascii.Error, ValueError):
+            raise ValidationError("Некорректные данные base64.")
+        if pos == start and sniff_image_format(chunk) not in allowed_formats:
+            raise ValidationError("Неподдерживаемый формат изображения.")
+        file.write(chunk)
+
+
+def _inspect_image(
+    file: SpooledTemporaryFile, max_pixels: int
+) -> tuple[str, tuple[int, int]]:
+    """
+    Проверяет изображение по заголовку, не распаковывая пиксели.
+    """
+    try:
+        with Image.open(file) as image:
+            if image.size[0] * image.size[1] > max_pixels:
+                raise ValidationError(
+                    "Слишком большое разрешение изображения."
+                )
+            image.verify()
+            return image.format.lower(), image.size
+    except Image.DecompressionBombError:
+        raise ValidationError("Слишком большое разрешение изображения.")
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise ValidationError("Загрузите корректное изображение.")
+
+
+def decode_base64_image(
+    data: str,
+    max_size: int,
+    max_pixels: int,
+    allowed_formats: Iterable[str],
+    chunk_size: int = BASE64_CHUNK_SIZE,
+) -> tuple[SpooledTemporaryFile, str, tuple[int, int]]:
+    """
+    Декодирует изображение из base64 (в том числе из data URL)
+    во временный файл по частям.
+
+    Проверки выполняются как можно раньше: размер - по длине строки
+    до декодирования, формат - по первой декодированной части,
+    размеры в пикселях - по заголовку изображения, без распаковки
+    (защита от "бомб распаковки").
+
+    :param data: Строка base64, например `data:image/png;base64,...`.
+    :param max_size: Максимальный размер файла в байтах.
+    :param max_pixels: Максимальное количество пикселей.
+    :param allowed_formats: Допустимые форматы изображения.
+    :param chunk_size: Размер декодируемой за шаг части строки.
+    :raises ValidationError: Если данные не проходят проверку.
+    :return: Файл, открытый на начале, формат и размеры изображения.
+    """
+    start = data.find(";base64,", 0, 256)
+    start = 0 if start == -1 else start + len(";base64,")
+
+    if (len(data) - start) // 4 * 3 > max_size:
+        raise ValidationError(
+            f"Размер изображения больше {max_size // 1024 ** 2} МБ."
+        )
+
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        _write_base64(data, start, file, set(allowed_formats), chunk_size)
+        file.seek(0)
+        image_format, size = _inspect_image(file, max_pixels)
+    except BaseException:
+        file.close()
+        raise
+
+    file.seek(0)
+    return file, image_format, size
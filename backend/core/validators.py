@@ -1,10 +1,12 @@
 from re import compile
 from string import hexdigits
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Container, Mapping
 
 from django.core.exceptions import ValidationError
 from django.utils.deconstruct import deconstructible
 
+from .enums import Limits
+
 if TYPE_CHECKING:
     from recipes.models import Ingredient, Tag
 
@@ -106,58 +108,161 @@ def hex_color_validator(color: str) -> str:
     return "#" + color.upper()
 
 
-def tags_exist_validator(tags_ids: list[int | str], Tag: "Tag") -> list["Tag"]:
+def _parse_id(value) -> int | None:
     """
-    Валидатор, который проверяет,
-    что переданные идентификаторы тэгов существуют.
+    Приводит идентификатор к int.
 
-    :param tags_ids: Список идентификаторов тэгов.
-    :param Tag: Модель тэга.
-    :return: Список существующих тэгов.
+    :return: Идентификатор или None, если значение некорректно.
     """
-    if not tags_ids:
-        raise ValidationError("Не указаны тэги")
-
-    tags = Tag.objects.filter(id__in=tags_ids)
-
-    if len(tags) != len(tags_ids):
-        raise ValidationError("Указан несуществующий тэг")
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
 
-    return tags
 
-
-def ingredients_validator(
-    ingredients: list[dict[str, str | int]],
-    Ingredient: "Ingredient",
-) -> dict[int, tuple["Ingredient", int]]:
+def _parse_amounts(
+    ingredients: list, errors: list[str]
+) -> dict[int | str, int]:
     """
-    Валидатор, который проверяет корректность переданных ингредиентов.
+    Проверяет количества ингредиентов и собирает ошибки в errors.
 
-    :param ingredients: Список словарей с ингредиентами и их количеством.
-    :param Ingredient: Модель ингредиента.
-    :return: Словарь с корректными
+    :return: Словарь, где ключи - ID ингредиентов (как переданы),
+        значения - количества.
     """
-    if not ingredients:
-        raise ValidationError("Не указаны ингридиенты")
-
-    valid_ings = {}
-
+    amounts = {}
     for ing in ingredients:
-        if not (isinstance(ing["amount"], int) or ing["amount"].isdigit()):
-            raise ValidationError("Неправильное количество ингидиента")
+        if not isinstance(ing, dict) or not isinstance(
+            ing.get("id"), (int, str)
+        ):
+            errors.append("Неправильный формат ингредиента")
+            continue
+
+        amount = ing.get("amount")
+        if isinstance(amount, str) and amount.isdigit():
+            amount = int(amount)
+        if (
+            not isinstance(amount, int)
+            or isinstance(amount, bool)
+            or not Limits.MIN_AMOUNT_INGREDIENTS
+            <= amount
+            <= Limits.MAX_AMOUNT_STORED
+        ):
+            errors.append(
+                f"Неправильное количество ингредиента {ing['id']}: "
+                f"от {Limits.MIN_AMOUNT_INGREDIENTS} "
+                f"до {Limits.MAX_AMOUNT_STORED}"
+            )
+            continue
+        amounts[ing["id"]] = amount
+    return amounts
+
+
+def collect_ingredients_ids(recipes: list) -> set[int]:
+    """
+    Собирает ID ингредиентов из данных нескольких рецептов, чтобы
+    проверить их существование одним запросом (`known_ingredients`
+    в `recipe_relations_validator`).
 
-        valid_ings[ing["id"]] = int(ing["amount"])
-        if valid_ings[ing["id"]] <= 0:
-            raise ValidationError("Неправильное количество ингридиента")
+    :param recipes: Необработанные данные рецептов.
+    :return: Множество корректных ID ингредиентов.
+    """
+    ids = set()
+    for recipe in recipes:
+        if not isinstance(recipe, dict):
+            continue
+        ingredients = recipe.get("ingredients")
+        if isinstance(ingredients, list):
+            ids.update(
+                _parse_id(ing.get("id"))
+                for ing in ingredients
+                if isinstance(ing, dict)
+            )
+    ids.discard(None)
+    return ids
+
+
+def recipe_relations_validator(
+    tags_ids: list[int | str] | None,
+    ingredients: list[dict[str, str | int]] | None,
+    tags_by_id: Mapping[int, "Tag"],
+    Ingredient: "Ingredient",
+    known_ingredients: Container[int] | None = None,
+) -> tuple[list["Tag"], dict[int, int]]:
+    """
+    Валидатор тэгов и ингредиентов рецепта.
 
-    if not valid_ings:
-        raise ValidationError("Неправильные ингидиенты")
+    Проверяет все данные сразу и сообщает обо всех ошибках одним
+    исключением: тэги ищутся в `tags_by_id` (снимок каталога в памяти),
+    ингредиенты - одним запросом к базе данных. Поэтому запись рецепта
+    начинается только с данными, которые гарантированно сохранятся.
 
-    db_ings = Ingredient.objects.filter(pk__in=valid_ings.keys())
-    if not db_ings:
-        raise ValidationError("Неправильные ингидиенты")
+    :param tags_ids: Список идентификаторов тэгов.
+    :param ingredients: Список словарей с ID ингредиентов
+        и их количеством.
+    :param tags_by_id: Существующие тэги по ID
+        (например, `core.cache.get_tag_snapshot().by_id`).
+    :param Ingredient: Модель ингредиента.
+    :param known_ingredients: ID существующих ингредиентов, загруженные
+        заранее (например, для пакета рецептов). Если указаны,
+        база данных не запрашивается.
+    :raises ValidationError: Словарь ошибок по полям `tags`
+        и `ingredients`.
+    :return: Список тэгов без повторов и словарь,
+        где ключи - ID ингредиентов, значения - количества.
+    """
+    errors = {"tags": [], "ingredients": []}
+
+    if not tags_ids or not isinstance(tags_ids, list):
+        errors["tags"].append("Не указаны тэги")
+        tags_ids = []
+    if not ingredients or not isinstance(ingredients, list):
+        errors["ingredients"].append("Не указаны ингредиенты")
+        ingredients = []
+
+    parsed_tags = [_parse_id(value) for value in tags_ids]
+    missing = [
+        str(value)
+        for value, tag_id in zip(tags_ids, parsed_tags)
+        if tag_id not in tags_by_id
+    ]
+    if missing:
+        errors["tags"].append(
+            f"Указаны несуществующие тэги: {', '.join(missing)}"
+        )
+    tags = [
+        tags_by_id[tag_id]
+        for tag_id in dict.fromkeys(parsed_tags)
+        if tag_id in tags_by_id
+    ]
+
+    amounts = _parse_amounts(ingredients, errors["ingredients"])
+    ingredients_ids = {value: _parse_id(value) for value in amounts}
+    existing = known_ingredients
+    if existing is None:
+        existing = set(
+            Ingredient.objects.filter(
+                pk__in=[
+                    pk for pk in ingredients_ids.values() if pk is not None
+                ]
+            ).values_list("pk", flat=True)
+        )
+    missing = [
+        str(value)
+        for value, pk in ingredients_ids.items()
+        if pk not in existing
+    ]
+    if missing:
+        errors["ingredients"].append(
+            f"Указаны несуществующие ингредиенты: {', '.join(missing)}"
+        )
 
-    for ing in db_ings:
-        valid_ings[ing.pk] = (ing, valid_ings[ing.pk])
+    errors = {
+        field: messages for field, messages in errors.items() if messages
+    }
+    if errors:
+        raise ValidationError(errors)
 
-    return valid_ings
+    return tags, {
+        ingredients_ids[value]: amount for value, amount in amounts.items()
+    }
@@ -75,6 +75,33 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="foodgram"),
+    }
+}
+
+INGREDIENTS_CACHE_TIMEOUT = config(
+    "INGREDIENTS_CACHE_TIMEOUT", default=60 * 60, cast=int
+)
+
+COUNT_CACHE_TIMEOUT = config("COUNT_CACHE_TIMEOUT", default=10 * 60, cast=int)
+
+# Максимальный возраст (в секундах) снимков каталогов в памяти процесса.
+# Ограничивает устаревание, если версия в кэше не видна другим процессам.
+LOCAL_SNAPSHOT_TTL = config("LOCAL_SNAPSHOT_TTL", default=60, cast=int)
+
+IMAGE_WORKER_THREAD = config("IMAGE_WORKER_THREAD", default=True, cast=bool)
+
+SHOPPING_LIST_PDF_FONT = config(
+    "SHOPPING_LIST_PDF_FONT",
+    default="/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+
 AUTH_USER_MODEL = "users.MyUser"
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -142,6 +169,12 @@ LOGGING = {
         },
     },
     "loggers": {
+        "core": {
+            "level": "INFO",
+            "handlers": [
+                "console",
+            ],
+        },
         "django.db.backends": {
             "level": "DEBUG",
             "handlers": [
@@ -1,3 +1,4 @@
+from core.services import cart_totals_recipe_changed, recipe_amounts
 from django.contrib.admin import (
     ModelAdmin,
     TabularInline,
@@ -78,8 +79,20 @@ class RecipeAdmin(ModelAdmin):
     save_on_top = True
     empty_value_display = EMPTY_VALUE_DISPLAY
 
+    def save_related(self, request, form, formsets, change) -> None:
+        """
+        Обновляет списки покупок, если в админке изменили ингредиенты.
+        """
+        old_amounts = recipe_amounts(form.instance.pk) if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            cart_totals_recipe_changed(form.instance.pk, old_amounts)
+
     def get_image(self, obj: Recipe) -> SafeString:
-        return mark_safe(f'<img src={obj.image.url} width="80" hieght="30"')
+        url = obj.image.url
+        for name, _ in obj.renditions.get("jpeg", ())[:1]:
+            url = obj.image.storage.url(name)
+        return mark_safe(f'<img src={url} width="80" hieght="30"')
 
     get_image.short_description = "Изображение"
 
@@ -1,17 +1,98 @@
+from typing import Iterable
+
+from core.cache import get_tag_snapshot
+from django import forms
+from django.db import connection
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    Func,
+    OuterRef,
+    Q,
+    QuerySet,
+    Value,
+)
 from django_filters import rest_framework as filters
 from .models import Recipe, Tag
 
 
+class RecipeFullTextMatch(Func):
+    """
+    Полнотекстовое условие по названию и описанию рецепта (PostgreSQL).
+
+    Выражение совпадает с выражением GIN-индекса
+    `recipes_recipe_search_tsv` (миграция 0003) и проверяется для самой
+    строки рецепта, поэтому вместе с поиском подстроки в названии
+    (`recipes_recipe_name_trgm`) планировщик объединяет оба индекса
+    через BitmapOr.
+    """
+
+    arity = 3
+    output_field = BooleanField()
+
+    def __init__(self, query: str) -> None:
+        super().__init__(F("name"), F("text"), Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.source_expressions:
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        name, text, query = parts
+        return (
+            f"to_tsvector('russian'::regconfig, {name}::text || ' ' || "
+            f"{text}) @@ plainto_tsquery('russian'::regconfig, {query})",
+            params,
+        )
+
+
+def filter_by_tags(
+    queryset: QuerySet[Recipe], tags: Iterable[Tag]
+) -> QuerySet[Recipe]:
+    """
+    Оставляет рецепты, у которых есть хотя бы один из тегов.
+
+    Условие `EXISTS` по таблице связи рецептов и тегов не размножает
+    строки рецепта, поэтому `DISTINCT` не нужен. Подзапрос покрывается
+    индексами таблицы связи: уникальным `(recipe_id, tag_id)` при проверке
+    каждого рецепта и `(tag_id, recipe_id)` (миграция 0009)
+    при полусоединении со стороны тегов.
+    """
+    return queryset.filter(
+        Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef("pk"), tag__in=tags
+            )
+        )
+    )
+
+
+def tag_choices() -> list[tuple[str, str]]:
+    """
+    Варианты фильтра по тегам из снимка каталога тегов.
+    """
+    return [(slug, slug) for slug in get_tag_snapshot().by_slug]
+
+
+class TagSlugsFilter(filters.Filter):
+    """
+    Фильтр по нескольким слагам тегов (`?tags=a&tags=b`).
+
+    Слаги проверяются по вариантам `choices` без запроса к базе данных.
+    """
+
+    field_class = forms.MultipleChoiceField
+
+
 class RecipeFilter(filters.FilterSet):
     """Фильтры рецептов"""
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-    )
+    tags = TagSlugsFilter(choices=tag_choices, method='filter_tags')
 
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
+    search = filters.CharFilter(method='filter_search')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
@@ -20,6 +101,14 @@ class RecipeFilter(filters.FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        by_slug = get_tag_snapshot().by_slug
+        return filter_by_tags(
+            queryset, [by_slug[slug] for slug in value if slug in by_slug]
+        )
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
@@ -31,3 +120,22 @@ class RecipeFilter(filters.FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(in_carts__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """
+        Поиск по названию и описанию рецепта.
+
+        На PostgreSQL использует полнотекстовый поиск по названию и
+        описанию и поиск подстроки в названии (оба покрыты GIN-индексами),
+        на остальных СУБД - поиск подстроки.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor == 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | RecipeFullTextMatch(value)
+            )
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        )
@@ -0,0 +1,73 @@
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.filters import filter_by_tags
+from recipes.models import Recipe, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает фильтр рецептов по тегам через JOIN с DISTINCT "
+        "и через EXISTS: планы запросов и время выполнения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tags",
+            nargs="*",
+            help="tag slugs, by default - all tags",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="runs per query",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=6,
+            help="page size",
+        )
+
+    def handle(self, *args, **options):
+        tags = Tag.objects.all()
+        if options["tags"]:
+            tags = tags.filter(slug__in=options["tags"])
+        tags = list(tags)
+        if not tags:
+            raise CommandError("Теги не найдены.")
+
+        recipes = Recipe.objects.select_related("author")
+        queries = (
+            ("join + distinct", recipes.filter(tags__in=tags).distinct()),
+            ("exists", filter_by_tags(recipes, tags)),
+        )
+        explain_options = (
+            {"analyze": True} if connection.vendor == "postgresql" else {}
+        )
+
+        results = []
+        for title, queryset in queries:
+            page = queryset[:options["limit"]]
+            timings = []
+            for _ in range(options["repeat"]):
+                start = perf_counter()
+                count = queryset.count()
+                ids = [recipe.pk for recipe in page]
+                timings.append(perf_counter() - start)
+            results.append((count, ids))
+
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(page.explain(**explain_options))
+            self.stdout.write(
+                f"count: {count}, "
+                f"count + page, median: {median(timings) * 1000:.2f} ms\n"
+            )
+
+        if results[0] != results[1]:
+            raise CommandError("Результаты запросов различаются.")
+        self.stdout.write(self.style.SUCCESS("Результаты совпадают."))
@@ -1,27 +1,97 @@
 import json
+from pathlib import Path
+from time import perf_counter
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 
-from recipes.models import Ingredient
+from core.cache import bump_ingredients_version, cache_is_shared
+from core.importers import ROW_READERS
+from core.services import (
+    bulk_import_ingredients,
+    copy_import_ingredients,
+    stream_import_ingredients,
+)
 
 
 class Command(BaseCommand):
+    help = (
+        "Загружает ингредиенты из JSON-файла (массив объектов), "
+        "CSV-файла или файла JSON Lines (.jsonl, .ndjson). "
+        "CSV и JSON Lines читаются потоково."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("--path", type=str, help="file path")
+        parser.add_argument(
+            "--format",
+            choices=("json", *ROW_READERS),
+            help="file format, by default - file extension",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="rows per INSERT",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="PostgreSQL only: COPY into a staging table",
+        )
 
     def handle(self, *args, **options):
         file_path = options["path"]
+        file_format = options["format"] or Path(file_path).suffix[1:].lower()
+        start = perf_counter()
 
+        if file_format == "json":
+            inserted, skipped = self.load_json(file_path, options)
+        elif file_format in ROW_READERS:
+            inserted, skipped = self.load_stream(
+                file_path, file_format, options
+            )
+        else:
+            raise CommandError(f"Неизвестный формат файла: {file_format}")
+
+        bump_ingredients_version()
+        if not cache_is_shared():
+            self.stderr.write(
+                self.style.WARNING(
+                    "Кэш в памяти процесса: веб-воркеры увидят новые "
+                    "ингредиенты только после истечения кэша "
+                    "(настройте CACHE_BACKEND, например Redis)."
+                )
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Добавлено: {inserted}, пропущено: {skipped}, "
+                f"время: {perf_counter() - start:.2f} с"
+            )
+        )
+
+    def load_json(self, file_path: str, options: dict) -> tuple[int, int]:
         with open(file_path, encoding='utf-8') as f:
             jsondata = json.load(f)
 
-            if 'measurement_unit' in jsondata[0]:
-                for line in jsondata:
-                    if not Ingredient.objects.filter(
-                       name=line['name'],
-                       measurement_unit=line['measurement_unit']).exists():
-                        Ingredient.objects.create(
-                            name=line['name'],
-                            measurement_unit=line['measurement_unit']
-                        )
+        if not jsondata or 'measurement_unit' not in jsondata[0]:
+            return 0, 0
+
+        return bulk_import_ingredients(
+            ((line['name'], line['measurement_unit']) for line in jsondata),
+            batch_size=options["batch_size"],
+        )
+
+    def load_stream(
+        self, file_path: str, file_format: str, options: dict
+    ) -> tuple[int, int]:
+        rows = ROW_READERS[file_format](file_path)
+
+        if not options["copy"]:
+            return stream_import_ingredients(
+                rows, batch_size=options["batch_size"]
+            )
+        if connection.vendor != "postgresql":
+            raise CommandError("--copy поддерживается только в PostgreSQL.")
+        return copy_import_ingredients(rows, batch_size=options["batch_size"])
@@ -0,0 +1,79 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from core.images import process_image_job
+from recipes.models import ImageJob, Recipe
+
+
+class Command(BaseCommand):
+    help = "Выполняет задачи обработки изображений рецептов из очереди."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="keep polling the queue",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="seconds between polls with --loop",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="queue recipes that have an image but no renditions",
+        )
+
+    def backfill(self) -> None:
+        """
+        Ставит в очередь изображения рецептов без вариантов. Изображения,
+        для которых задача уже создавалась (ожидает обработки или
+        завершилась ошибкой), повторно не ставятся.
+        """
+        jobs = ImageJob.objects.filter(
+            recipe=OuterRef("pk"), image=OuterRef("image")
+        )
+        recipes = (
+            Recipe.objects.filter(renditions={})
+            .exclude(image="")
+            .exclude(Exists(jobs))
+            .values_list("pk", "image")
+        )
+        jobs = ImageJob.objects.bulk_create(
+            (
+                ImageJob(recipe_id=recipe_id, image=image)
+                for recipe_id, image in recipes.iterator()
+            ),
+            batch_size=1000,
+        )
+        self.stdout.write(f"Поставлено в очередь изображений: {len(jobs)}")
+
+    def process(self, job_id: int) -> bool:
+        """
+        Выполняет задачу. Ошибка одной задачи (она помечается
+        `process_image_job` как завершенная с ошибкой) не останавливает
+        обработку очереди.
+        """
+        try:
+            return process_image_job(job_id)
+        except Exception as error:
+            self.stderr.write(f"Задача {job_id}: {error!r}")
+            return False
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            self.backfill()
+        while True:
+            pending = ImageJob.objects.filter(
+                status=ImageJob.Status.PENDING
+            ).values_list("pk", flat=True)
+            done = sum(self.process(job_id) for job_id in pending)
+            if done:
+                self.stdout.write(f"Обработано изображений: {done}")
+            if not options["loop"]:
+                break
+            sleep(options["interval"])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import cache_is_shared, get_metrics
+from core.enums import Metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает счетчики поиска ингредиентов. "
+        "Значения воркеров видны только при общем кэше (CACHE_BACKEND)."
+    )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stderr.write(
+                "Кэш не общий для процессов: показаны только счетчики "
+                "этой команды. Задайте CACHE_BACKEND (Redis)."
+            )
+        metrics = get_metrics(*(metric.value for metric in Metrics))
+        for name, value in metrics.items():
+            self.stdout.write(f"{name}: {value}")
@@ -0,0 +1,61 @@
+from django.db import migrations, models
+
+SEARCH_INDEXES = (
+    (
+        "recipes_ingredient_name_trgm",
+        'CREATE INDEX IF NOT EXISTS "{}" ON "recipes_ingredient" '
+        'USING gin (UPPER("name"::text) gin_trgm_ops);',
+    ),
+    (
+        "recipes_recipe_name_trgm",
+        'CREATE INDEX IF NOT EXISTS "{}" ON "recipes_recipe" '
+        'USING gin (UPPER("name"::text) gin_trgm_ops);',
+    ),
+    (
+        "recipes_recipe_search_tsv",
+        'CREATE INDEX IF NOT EXISTS "{}" ON "recipes_recipe" '
+        "USING gin (to_tsvector('russian'::regconfig, "
+        "\"name\"::text || ' ' || \"text\"));",
+    ),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    for name, sql in SEARCH_INDEXES:
+        schema_editor.execute(sql.format(name))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}";')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ingredient",
+            name="measurement_unit",
+            field=models.CharField(
+                db_index=True,
+                max_length=24,
+                verbose_name="Единицы измерения",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ingredient",
+            name="name",
+            field=models.CharField(
+                db_index=True, max_length=64, verbose_name="Ингредиент"
+            ),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    AmountIngredient = apps.get_model("recipes", "AmountIngredient")
+    CartIngredientTotal = apps.get_model("recipes", "CartIngredientTotal")
+    totals = (
+        AmountIngredient.objects.filter(recipe__in_carts__isnull=False)
+        .values(
+            cart_user=F("recipe__in_carts__user"),
+            ingredient=F("ingredients"),
+        )
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    CartIngredientTotal.objects.bulk_create(
+        (
+            CartIngredientTotal(
+                user_id=row["cart_user"],
+                ingredient_id=row["ingredient"],
+                total_amount=row["total"],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0003_search_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CartIngredientTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total_amount",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Суммарное количество"
+                    ),
+                ),
+                (
+                    "ingredient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cart_totals",
+                        to="recipes.ingredient",
+                        verbose_name="Ингредиент",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cart_totals",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец списка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ингредиент в списке покупок",
+                "verbose_name_plural": "Ингредиенты в списке покупок",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "ingredient"),
+                        name="\nrecipes_cartingredienttotal ingredient alredy counted\n",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
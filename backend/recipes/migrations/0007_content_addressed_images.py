@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:26
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0006_recipe_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="recipe",
+            name="image",
+            field=models.ImageField(
+                db_index=True,
+                storage=core.storage.ContentAddressedStorage(),
+                upload_to="recipe_images/",
+                verbose_name="Изображение блюда",
+            ),
+        ),
+    ]
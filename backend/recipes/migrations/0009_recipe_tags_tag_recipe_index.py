@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0008_recipe_pub_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS "recipes_recipe_tags_tag_recipe_idx" '
+            'ON "recipes_recipe_tags" ("tag_id", "recipe_id");',
+            'DROP INDEX IF EXISTS "recipes_recipe_tags_tag_recipe_idx";',
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_cart_versions(apps, schema_editor):
+    CartIngredientTotal = apps.get_model("recipes", "CartIngredientTotal")
+    CartVersion = apps.get_model("recipes", "CartVersion")
+    users_ids = (
+        CartIngredientTotal.objects.values_list("user_id", flat=True)
+        .order_by()
+        .distinct()
+    )
+    CartVersion.objects.bulk_create(
+        (CartVersion(user_id=user_id, version=1) for user_id in users_ids),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0009_recipe_tags_tag_recipe_index"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CartVersion",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="cart_version",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец списка",
+                    ),
+                ),
+                (
+                    "version",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Версия"
+                    ),
+                ),
+                (
+                    "updated",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Дата изменения"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Версия списка покупок",
+                "verbose_name_plural": "Версии списков покупок",
+            },
+        ),
+        migrations.RunPython(fill_cart_versions, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
-from core.enums import Limits, Tuples
+from core.enums import Limits
+from core.images import enqueue_image_job, release_images
+from core.storage import recipe_image_storage
 from core.validators import OneOfTwoValidator, hex_color_validator
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
@@ -10,15 +12,20 @@ from django.db.models import (
     DateTimeField,
     ForeignKey,
     ImageField,
+    Index,
+    JSONField,
     ManyToManyField,
     Model,
+    OneToOneField,
+    PositiveBigIntegerField,
+    PositiveIntegerField,
     PositiveSmallIntegerField,
     Q,
+    TextChoices,
     TextField,
     UniqueConstraint,
 )
 from django.db.models.functions import Length
-from PIL import Image
 
 CharField.register_lookup(Length)
 
@@ -137,6 +144,14 @@ class Recipe(Model):
     image = ImageField(
         verbose_name="Изображение блюда",
         upload_to="recipe_images/",
+        storage=recipe_image_storage,
+        db_index=True,
+    )
+    renditions = JSONField(
+        verbose_name="Варианты изображения",
+        default=dict,
+        blank=True,
+        editable=False,
     )
     text = TextField(
         verbose_name="Описание блюда",
@@ -161,6 +176,12 @@ class Recipe(Model):
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("-pub_date",)
+        indexes = (
+            Index(
+                fields=("-pub_date", "-id"),
+                name="recipe_pub_date_id_idx",
+            ),
+        )
         constraints = (
             UniqueConstraint(
                 fields=("name", "author"),
@@ -179,11 +200,30 @@ class Recipe(Model):
         self.name = self.name.capitalize()
         return super().clean()
 
+    @classmethod
+    def from_db(cls, db, field_names, values) -> "Recipe":
+        instance = super().from_db(db, field_names, values)
+        if "image" in field_names:
+            instance._loaded_image = values[field_names.index("image")]
+        return instance
+
     def save(self, *args, **kwargs) -> None:
+        """
+        Сохраняет рецепт. Если изображение изменилось, после фиксации
+        транзакции ставит задачу на его обработку в фоне, а прежнее
+        изображение освобождает (`release_images`).
+        """
+        loaded_image = getattr(self, "_loaded_image", None)
+        image_changed = (
+            self._state.adding or self.image.name != loaded_image
+        )
+        if image_changed:
+            self.renditions = {}
         super().save(*args, **kwargs)
-        image = Image.open(self.image.path)
-        image.thumbnail(Tuples.RECIPE_IMAGE_SIZE)
-        image.save(self.image.path)
+        if image_changed:
+            self._loaded_image = self.image.name
+            enqueue_image_job(self)
+            release_images(loaded_image)
 
 
 class AmountIngredient(Model):
@@ -306,3 +346,120 @@ class Carts(Model):
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
+
+
+class CartIngredientTotal(Model):
+    """
+    Суммарное количество ингредиентов в списке покупок пользователя.
+
+    Денормализованная таблица: обновляется при добавлении и удалении
+    рецептов из корзины и при изменении ингредиентов рецептов в корзине.
+    """
+
+    user = ForeignKey(
+        verbose_name="Владелец списка",
+        related_name="cart_totals",
+        to=User,
+        on_delete=CASCADE,
+    )
+    ingredient = ForeignKey(
+        verbose_name="Ингредиент",
+        related_name="cart_totals",
+        to=Ingredient,
+        on_delete=CASCADE,
+    )
+    total_amount = PositiveIntegerField(
+        verbose_name="Суммарное количество",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Ингредиент в списке покупок"
+        verbose_name_plural = "Ингредиенты в списке покупок"
+        constraints = (
+            UniqueConstraint(
+                fields=(
+                    "user",
+                    "ingredient",
+                ),
+                name="\n%(app_label)s_%(class)s ingredient alredy counted\n",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.user} -> {self.total_amount} {self.ingredient}"
+
+
+class CartVersion(Model):
+    """
+    Версия списка покупок пользователя.
+
+    Увеличивается в одной транзакции с изменением `CartIngredientTotal`
+    и служит для условных запросов (`ETag`, `Last-Modified`) при выгрузке
+    списка покупок.
+    """
+
+    user = OneToOneField(
+        verbose_name="Владелец списка",
+        related_name="cart_version",
+        to=User,
+        on_delete=CASCADE,
+        primary_key=True,
+    )
+    version = PositiveBigIntegerField(
+        verbose_name="Версия",
+        default=0,
+    )
+    updated = DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = "Версия списка покупок"
+        verbose_name_plural = "Версии списков покупок"
+
+    def __str__(self) -> str:
+        return f"{self.user} -> {self.version}"
+
+
+class ImageJob(Model):
+    """Задачи фоновой обработки изображений рецептов"""
+
+    class Status(TextChoices):
+        PENDING = "pending", "В очереди"
+        DONE = "done", "Выполнена"
+        FAILED = "failed", "Ошибка"
+
+    recipe = ForeignKey(
+        verbose_name="Рецепт",
+        related_name="image_jobs",
+        to=Recipe,
+        on_delete=CASCADE,
+    )
+    image = CharField(
+        verbose_name="Файл изображения",
+        max_length=100,
+    )
+    status = CharField(
+        verbose_name="Статус",
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+    )
+    error = TextField(
+        verbose_name="Ошибка",
+        blank=True,
+    )
+    date_added = DateTimeField(
+        verbose_name="Дата добавления", auto_now_add=True, editable=False
+    )
+
+    class Meta:
+        verbose_name = "Обработка изображения"
+        verbose_name_plural = "Обработка изображений"
+        ordering = ("date_added",)
+
+    def __str__(self) -> str:
+        return f"{self.image}: {self.status}"
@@ -2,7 +2,9 @@ import pytest
 from backend.core.validators import (
     OneOfTwoValidator,
     MinLenValidator,
-    hex_color_validator
+    collect_ingredients_ids,
+    hex_color_validator,
+    recipe_relations_validator,
 )
 from django.core.exceptions import ValidationError
 
@@ -50,3 +52,96 @@ invalid_colors = ('3', '33', '3653', '7654321', 'bb', '44d', '33d33ff')
 @pytest.mark.parametrize('color', invalid_colors)
 def test_color_invalid(color):
     pytest.raises(ValidationError, hex_color_validator, color)
+
+
+class FakeIngredients:
+    """Заменяет `Ingredient.objects` с ингредиентами 1, 2 и 3."""
+
+    ids = {1, 2, 3}
+
+    def filter(self, pk__in):
+        self.found = [pk for pk in pk__in if pk in self.ids]
+        return self
+
+    def values_list(self, *fields, flat=False):
+        return self.found
+
+
+class FakeIngredient:
+    objects = FakeIngredients()
+
+
+tags_by_id = {1: 'завтрак', 2: 'обед'}
+
+
+@pytest.mark.validators
+def test_recipe_relations_correct():
+    tags, ingredients = recipe_relations_validator(
+        [2, '1', 2],
+        [{'id': 1, 'amount': 3}, {'id': '3', 'amount': '10'}],
+        tags_by_id,
+        FakeIngredient,
+    )
+    assert tags == ['обед', 'завтрак']
+    assert ingredients == {1: 3, 3: 10}
+
+
+@pytest.mark.validators
+def test_recipe_relations_reports_all_errors():
+    with pytest.raises(ValidationError) as error:
+        recipe_relations_validator(
+            [1, 7, 'x'],
+            [
+                {'id': 1, 'amount': 0},
+                {'id': 5, 'amount': 1},
+                {'id': 9, 'amount': 2},
+                {'amount': 1},
+            ],
+            tags_by_id,
+            FakeIngredient,
+        )
+    errors = error.value.message_dict
+    assert errors['tags'] == ['Указаны несуществующие тэги: 7, x']
+    assert len(errors['ingredients']) == 3
+    assert errors['ingredients'][-1] == (
+        'Указаны несуществующие ингредиенты: 5, 9'
+    )
+
+
+@pytest.mark.validators
+def test_recipe_relations_known_ingredients():
+    FakeIngredient.objects.found = None
+    tags, ingredients = recipe_relations_validator(
+        [1],
+        [{'id': 7, 'amount': 1}],
+        tags_by_id,
+        FakeIngredient,
+        known_ingredients={7},
+    )
+    assert ingredients == {7: 1}
+    assert FakeIngredient.objects.found is None
+
+
+@pytest.mark.validators
+def test_recipe_relations_amount_limits():
+    with pytest.raises(ValidationError) as error:
+        recipe_relations_validator(
+            [1],
+            [{'id': 1, 'amount': 32767}, {'id': 3, 'amount': 32768}],
+            tags_by_id,
+            FakeIngredient,
+        )
+    assert error.value.message_dict['ingredients'] == [
+        'Неправильное количество ингредиента 3: от 1 до 32767'
+    ]
+
+
+@pytest.mark.validators
+def test_collect_ingredients_ids():
+    recipes = [
+        {'ingredients': [{'id': 1}, {'id': '2'}, {'id': 'x'}, 5]},
+        {'ingredients': [{'id': 2}, {}]},
+        {'ingredients': 'bad'},
+        None,
+    ]
+    assert collect_ingredients_ids(recipes) == {1, 2}
@@ -0,0 +1,37 @@
+import pytest
+from backend.core.importers import batched, read_csv_rows, read_ndjson_rows
+
+
+@pytest.mark.importers
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched((), 2)) == []
+
+
+@pytest.mark.importers
+def test_read_csv_rows(tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(
+        'name,measurement_unit\n'
+        'абрикосовое варенье,г\n'
+        '\n'
+        'без единицы,\n'
+        '"соль, крупная",г\n',
+        encoding='utf-8',
+    )
+    assert list(read_csv_rows(path)) == [
+        ('абрикосовое варенье', 'г'),
+        ('соль, крупная', 'г'),
+    ]
+
+
+@pytest.mark.importers
+def test_read_ndjson_rows(tmp_path):
+    path = tmp_path / 'ingredients.jsonl'
+    path.write_text(
+        '{"name": "молоко", "measurement_unit": "мл"}\n'
+        '\n'
+        '{"name": "мука"}\n',
+        encoding='utf-8',
+    )
+    assert list(read_ndjson_rows(path)) == [('молоко', 'мл')]
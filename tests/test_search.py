@@ -0,0 +1,33 @@
+import pytest
+from backend.core.search import PrefixIndex
+
+ingredients = (
+    {'id': 1, 'name': 'кокосовое молоко', 'measurement_unit': 'мл'},
+    {'id': 2, 'name': 'молоко', 'measurement_unit': 'мл'},
+    {'id': 3, 'name': 'мука', 'measurement_unit': 'г'},
+    {'id': 4, 'name': 'Молочный шоколад', 'measurement_unit': 'г'},
+    {'id': 5, 'name': 'сухое молоко', 'measurement_unit': 'г'},
+)
+
+searches = (
+    ('мол', [2, 4, 1, 5]),
+    ('МОЛОКО', [2, 1, 5]),
+    ('  му ', [3]),
+    ('ко', [1, 2, 4, 5]),
+    ('о', [1, 2, 4, 5]),
+    ('сыр', []),
+)
+
+
+@pytest.mark.search
+@pytest.mark.parametrize('query, expected', searches)
+def test_prefix_before_substring(query, expected):
+    index = PrefixIndex(ingredients)
+    assert [ing['id'] for ing in index.search(query)] == expected
+
+
+@pytest.mark.search
+def test_empty_query_returns_all_sorted():
+    index = PrefixIndex(ingredients)
+    assert len(index) == len(ingredients)
+    assert [ing['id'] for ing in index.search('')] == [1, 2, 4, 3, 5]
@@ -0,0 +1,103 @@
+import base64
+import io
+import os
+import tracemalloc
+
+import pytest
+from backend.core.uploads import decode_base64_image, sniff_image_format
+from django.core.exceptions import ValidationError
+from PIL import Image
+
+MB = 1024 ** 2
+FORMATS = ('jpeg', 'png', 'gif')
+
+
+def make_image(size=(64, 48), image_format='PNG', noise=False):
+    image = Image.new('RGB', size, (10, 200, 10))
+    if noise:
+        image = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def data_url(content, mime='image/png'):
+    return f'data:{mime};base64,' + base64.b64encode(content).decode()
+
+
+@pytest.mark.uploads
+def test_sniff_image_format():
+    assert sniff_image_format(make_image(image_format='JPEG')) == 'jpeg'
+    assert sniff_image_format(make_image(image_format='PNG')) == 'png'
+    assert sniff_image_format(make_image(image_format='GIF')) == 'gif'
+    assert sniff_image_format(b'RIFF\0\0\0\0WEBPVP8 ') == 'webp'
+    assert sniff_image_format(b'<svg></svg>') is None
+
+
+@pytest.mark.uploads
+@pytest.mark.parametrize('prefix', ('data:image/png;base64,', ''))
+def test_decode_base64_image(prefix):
+    content = make_image()
+    data = prefix + base64.b64encode(content).decode()
+    file, image_format, size = decode_base64_image(
+        data, max_size=MB, max_pixels=10_000, allowed_formats=FORMATS,
+        chunk_size=16,
+    )
+    assert (image_format, size) == ('png', (64, 48))
+    assert file.read() == content
+
+
+invalid_payloads = {
+    'too-large': data_url(b'x' * 2 * MB),
+    'svg': data_url(b'<svg xmlns="http://www.w3.org/2000/svg"></svg>'),
+    'too-many-pixels': data_url(make_image(size=(200, 200))),
+    'bad-padding': data_url(make_image())[:-3],
+    'bad-symbols': 'data:image/png;base64,$$$$',
+    'truncated': data_url(make_image()[:40]),
+}
+
+
+@pytest.mark.uploads
+@pytest.mark.parametrize(
+    'data', invalid_payloads.values(), ids=invalid_payloads.keys()
+)
+def test_decode_base64_image_invalid(data):
+    with pytest.raises(ValidationError):
+        decode_base64_image(
+            data, max_size=MB, max_pixels=10_000, allowed_formats=FORMATS
+        )
+
+
+def peak_memory(func, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def decode_in_memory(data):
+    content = base64.b64decode(data.split(';base64,')[1])
+    with Image.open(io.BytesIO(content)) as image:
+        image.verify()
+
+
+@pytest.mark.uploads
+def test_decode_base64_image_peak_memory():
+    content = make_image(size=(1200, 1000), noise=True)
+    data = data_url(content)
+
+    in_memory = peak_memory(decode_in_memory, data)
+    streaming = peak_memory(
+        decode_base64_image, data, max_size=8 * MB, max_pixels=2 * MB,
+        allowed_formats=FORMATS,
+    )
+
+    print(
+        f'\npayload: {len(data) / MB:.2f} MB, '
+        f'in memory peak: {in_memory / MB:.2f} MB, '
+        f'streaming peak: {streaming / MB:.2f} MB'
+    )
+    assert len(content) > MB
+    assert streaming < in_memory / 2